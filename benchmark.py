@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import finder
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_TEXT = os.path.join(HERE, 'fake_pii.txt')
+REFERENCE_FOUND = os.path.join(HERE, 'found.json')
+
+# filler vocabulary for synthetic text, loosely modelled on business documents
+# and application logs
+FILLER_WORDS = (
+    "the of and to in a is that for it as was with be by on not he this are or "
+    "his from at which but have an they you were her she there been one all we "
+    "their has would when if so no will more can about said out up time them "
+    "some could into other then only its over also after new first two may "
+    "account customer order invoice payment request response status error info "
+    "warning debug service user session report meeting notes review please "
+    "thanks regards team project update data record total amount balance due "
+    "received shipped pending approved declined reference number ticket call").split()
+
+CAPITALIZED_WORDS = ("Monday Tuesday January March Chicago London Paris Support "
+                     "Sales Manager Director Account Customer Services Team "
+                     "Report Invoice Order").split()
+
+NAMES = ("John Smith", "Maria Garcia", "Wei Zhang", "Aisha Khan", "Olga Petrova",
+         "James O'Brien", "Anna-Lena Schmidt", "Kwame Mensah")
+
+
+def pii_shapes(reference_text=REFERENCE_TEXT):
+    '''
+    Collect the PII shaped text spans matched in a reference file (NAME is
+    excluded, so that NLTK is not needed to generate corpora)
+    Inputs:
+        reference_text: (str) Reference text file. Default is fake_pii.txt.
+    Returns: Sorted list of distinct matched text spans
+    '''
+    engine = finder.compile_corpora(finder.select_corpora(exclude_types=['NAME']))
+    shapes = set()
+    for _, line_text in finder.stream_ascii(reference_text):
+        for hits in engine.scan(line_text):
+            for _, start, end in hits:
+                shapes.add(line_text[start:end].strip())
+    return sorted(shape for shape in shapes if shape) + list(NAMES)
+
+
+def filler_line(rng, line_words):
+    '''
+    Generate a line of filler text with roughly line_words words
+    '''
+    n = max(0, int(rng.gauss(line_words, line_words / 3)))
+    words = [rng.choice(CAPITALIZED_WORDS) if rng.random() < 0.08 else rng.choice(FILLER_WORDS)
+             for _ in range(n)]
+    if words and rng.random() < 0.3:
+        words[-1] += rng.choice('.,:;!?')
+    return ' '.join(words)
+
+
+def generate_corpus(output_file, size_mb, pii_density=0.2, line_words=12, seed=0,
+                    shapes=None):
+    '''
+    Write a synthetic text corpus of (at least) a given size, mixing filler
+    text with PII shaped text. Lines are generated and written one at a time,
+    so corpora of any size can be generated in constant memory.
+    Inputs:
+        output_file: (str) Text file to write the corpus to
+        size_mb: (float) Size of corpus to generate, in megabytes
+        pii_density: (float) Fraction of lines containing PII shaped text.
+            Default is 0.2.
+        line_words: (int) Mean number of filler words per line. Default is 12.
+        seed: (int) Random seed, so corpora can be regenerated exactly.
+            Default is 0.
+        shapes: (list) PII shaped text spans to insert. Default is None, in
+            which case shapes are collected from fake_pii.txt.
+    Returns: Number of lines written
+    '''
+    rng = random.Random(seed)
+    shapes = shapes or pii_shapes()
+    target = int(size_mb * 1024 * 1024)
+    written, lines = 0, 0
+
+    with open(output_file, 'w') as f:
+        while written < target:
+            words = filler_line(rng, line_words).split(' ')
+            if rng.random() < pii_density:
+                words.insert(rng.randint(0, len(words)), rng.choice(shapes))
+            line = ' '.join(words) + '\n'
+            f.write(line)
+            written += len(line.encode())
+            lines += 1
+
+    return lines
+
+
+def throughput(lines, size_bytes, seconds):
+    '''
+    Returns: Dictionary of elapsed seconds, lines per second and megabytes per
+        second
+    '''
+    seconds = max(seconds, 1e-9)
+    return {'seconds': round(seconds, 3),
+            'lines_per_sec': round(lines / seconds, 1),
+            'mb_per_sec': round(size_bytes / seconds / (1024 * 1024), 3)}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    '''
+    Returns: Peak resident set size of this process (or of its finished child
+        processes) in megabytes
+    '''
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def bench_end_to_end(corpus_file, lines, workers=1, types=None):
+    '''
+    Time a complete finder.py run over a corpus in a separate process, so that
+    its peak memory use is measured on its own
+    Inputs:
+        corpus_file: (str) Text file to scan
+        lines: (int) Number of lines in corpus_file
+        workers: (int) Number of worker processes. Default is 1.
+        types: (list) PII types to scan for. Default is None (all types).
+    Returns: Dictionary of throughput statistics and peak RSS
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, 'found.ndjson')
+        cmd = [sys.executable, os.path.join(HERE, 'finder.py'), '--ascii_file', corpus_file,
+               '--output_file', output_file, '--workers', str(workers)]
+        if types:
+            cmd += ['--types', ','.join(types)]
+
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+
+        if proc.returncode != 0:
+            return {'error': proc.stderr.strip() or proc.stdout.strip()}
+
+        with open(output_file) as f:
+            findings = sum(1 for _ in f)
+
+    stats = throughput(lines, os.path.getsize(corpus_file), elapsed)
+    stats['findings'] = findings
+    stats['peak_rss_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return stats
+
+
+def bench_detectors(corpus_file, lines, types=None):
+    '''
+    Time each detector on its own over a corpus, in this process
+    Inputs:
+        corpus_file: (str) Text file to scan
+        lines: (int) Number of lines in corpus_file
+        types: (list) PII types to time. Default is None (all types).
+    Returns: Dictionary with PII types as keys and dictionaries of throughput
+        statistics as values
+    '''
+    size_bytes = os.path.getsize(corpus_file)
+    results = {}
+    for info_type in types or finder.INFO_TYPES:
+        engine = finder.compile_corpora(finder.select_corpora(types=[info_type]))
+        try:
+            start = time.perf_counter()
+            findings = sum(1 for _ in finder.scan_rows(finder.stream_ascii(corpus_file), engine))
+            results[info_type] = throughput(lines, size_bytes, time.perf_counter() - start)
+            results[info_type]['rows_with_findings'] = findings
+        except SystemExit as e:
+            results[info_type] = {'error': str(e)}
+    return results
+
+
+def check_reference(reference_text=REFERENCE_TEXT, reference_found=REFERENCE_FOUND,
+                    check_names=False):
+    '''
+    Scan the reference text file and compare the PII found with the reference
+    output, e.g. fake_pii.txt and found.json
+    Inputs:
+        check_names: (boolean) Whether to compare NAME matches too, which
+            depend on the version of NLTK and its models installed. Default
+            is False.
+    Returns: List of (row, PII type) tuples for which the PII found differs
+        from the reference output
+    '''
+    skipped = set() if check_names else {'NAME'}
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, 'found.json')
+        finder.pii_finder(reference_text, output_file=output_file,
+                          exclude_types=sorted(skipped) or None)
+        with open(output_file) as f:
+            found = json.load(f)[0]
+
+    with open(reference_found) as f:
+        expected = json.load(f)[0]
+
+    differences = []
+    for row in sorted(set(found) | set(expected), key=int):
+        found_row, expected_row = found.get(row, {}), expected.get(row, {})
+        for info_type in sorted((set(found_row) | set(expected_row)) - skipped):
+            if found_row.get(info_type) != expected_row.get(info_type):
+                differences.append((int(row), info_type))
+    return differences
+
+
+def print_table(title, rows):
+    '''
+    Print a dictionary of dictionaries of statistics as a text table
+    '''
+    print(f"\n{title}")
+    columns = ['seconds', 'lines_per_sec', 'mb_per_sec']
+    print(f"{'':30}" + ''.join(f"{column:>16}" for column in columns))
+    for name, stats in rows.items():
+        if 'error' in stats:
+            print(f"{name:30}  error: {stats['error'].splitlines()[0]}")
+        else:
+            print(f"{name:30}" + ''.join(f"{stats[column]:>16}" for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PII recognition throughput on a synthetic corpus.")
+
+    parser.add_argument('--size_mb', type=float, default=1, help="Size of synthetic corpus to generate, in megabytes. Default is 1.")
+    parser.add_argument('--corpus_file', type=str, help="File to write the synthetic corpus to, and keep. Default is a temporary file.")
+    parser.add_argument('--pii_density', type=float, default=0.2, help="Fraction of lines containing PII. Default is 0.2.")
+    parser.add_argument('--line_words', type=int, default=12, help="Mean number of words per line. Default is 12.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for corpus generation. Default is 0.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes for the end to end run. Default is 1.")
+    parser.add_argument('--types', type=str, help="Comma separated PII types to benchmark. Default is all types.")
+    parser.add_argument('--per_detector', action='store_true', help="Also time each detector on its own.")
+    parser.add_argument('--reference_found', type=str, default=REFERENCE_FOUND, help="Expected output for fake_pii.txt. Default is found.json.")
+    parser.add_argument('--skip_reference', action='store_true', help="Don't compare results on fake_pii.txt with found.json.")
+    parser.add_argument('--check_names', action='store_true', help="Also compare NAME matches, which depend on the NLTK models installed, with found.json.")
+    parser.add_argument('--json', type=str, help="JSON file to which to write benchmark results.")
+
+    a = parser.parse_args()
+    types = a.types.split(',') if a.types else None
+    results = {}
+    failed = False
+
+    tmp = None
+    corpus_file = a.corpus_file
+    if not corpus_file:
+        tmp = tempfile.NamedTemporaryFile(suffix='.txt', delete=False)
+        tmp.close()
+        corpus_file = tmp.name
+
+    try:
+        start = time.perf_counter()
+        lines = generate_corpus(corpus_file, a.size_mb, pii_density=a.pii_density,
+                                line_words=a.line_words, seed=a.seed)
+        results['corpus'] = {'file': corpus_file, 'lines': lines,
+                             'mb': round(os.path.getsize(corpus_file) / (1024 * 1024), 3),
+                             'generate_seconds': round(time.perf_counter() - start, 3)}
+        print(f"Generated {results['corpus']['mb']} MB, {lines} lines in "
+              f"{results['corpus']['generate_seconds']}s: {corpus_file}")
+
+        results['end_to_end'] = bench_end_to_end(corpus_file, lines, workers=a.workers, types=types)
+        print_table(f"End to end ({a.workers} worker(s))", {'all': results['end_to_end']})
+        if 'peak_rss_mb' in results['end_to_end']:
+            print(f"Peak RSS: {results['end_to_end']['peak_rss_mb']} MB")
+        else:
+            failed = True
+
+        if a.per_detector:
+            results['detectors'] = bench_detectors(corpus_file, lines, types=types)
+            print_table("Per detector", results['detectors'])
+
+        if not a.skip_reference:
+            differences = check_reference(reference_found=a.reference_found, check_names=a.check_names)
+            results['reference_differences'] = differences
+            if differences:
+                failed = True
+                print(f"\nReference check FAILED: results on fake_pii.txt differ from {a.reference_found} "
+                      f"for {len(differences)} row/PII type pairs, e.g. {differences[:5]}")
+            else:
+                print(f"\nReference check passed: results on fake_pii.txt match {a.reference_found}")
+
+    finally:
+        if tmp:
+            os.remove(corpus_file)
+
+    if a.json:
+        with open(a.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(1 if failed else 0)
@@ -1,8 +1,111 @@
+import os
 import re
-import nltk
 import json
 
 
+# area_codes.json lives at the root of the package, next to finder.py
+AREA_CODES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'area_codes.json')
+
+# (modification time, frozenset of valid US area codes) once loaded
+_area_codes = None
+
+# batches of fewer matches than this are verified one match at a time, as
+# NumPy's overhead per call outweighs vectorizing their checksums
+VECTORIZE_MIN_BATCH = 64
+
+# first digits of numbers verify_cc_match, south_africa_id and sweden_id accept
+LUHN_PREFIXES = ("3", "4", "5", "6", "8")
+
+_NON_DIGIT = re.compile(r"\D")
+
+# NumPy, only imported once a batch is large enough to vectorize, as importing
+# it takes longer than scanning a small file for a few PII types; False if it
+# is not installed
+np = None
+
+
+def _import_numpy():
+    '''
+    Import NumPy on first use
+    Returns: Whether NumPy is installed
+    '''
+    global np
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = False
+    return np is not False
+
+
+def _verify_vectorized(matches, verify_fcn, prepare, check):
+    '''
+    Helper function for batch checksum verifiers. Verifies a batch of regex
+    matches with NumPy array operations, giving the same result for each
+    match as verify_fcn. Small batches, and all batches if NumPy is not
+    installed, are verified one match at a time with verify_fcn.
+    Inputs:
+        matches: (list) Regex match strings
+        verify_fcn: (function) Function verifying a single match
+        prepare: (function) Function returning the values check needs for an
+            ASCII match, or None if the match must be verified by verify_fcn
+            (e.g. because verify_fcn would raise an error for it)
+        check: (function) Function taking a list of (match, prepared values)
+            tuples and returning a list of results for them
+    Returns: List of results for each match, as returned by verify_fcn
+    '''
+    if len(matches) < VECTORIZE_MIN_BATCH or not _import_numpy():
+        return [verify_fcn(match) for match in matches]
+
+    results = [None] * len(matches)
+    indices, prepared = [], []
+    for i, match in enumerate(matches):
+        values = prepare(match) if match.isascii() else None
+        if values is None:
+            results[i] = verify_fcn(match)
+        else:
+            indices.append(i)
+            prepared.append((match, values))
+
+    if prepared:
+        for i, result in zip(indices, check(prepared)):
+            results[i] = result
+    return results
+
+
+def _digit_matrix(digit_strings, width, align_right=True):
+    '''
+    Convert strings of ASCII digits into a NumPy array of digit values with
+    one row per string, padded with zeros to the same width
+    Inputs:
+        digit_strings: (list) Strings of ASCII digits, none longer than width
+        width: (int) Number of columns of the array
+        align_right: (boolean) Whether to pad strings on the left, so that
+            their last digits line up, or on the right. Default is True.
+    Returns: NumPy integer array of shape (len(digit_strings), width)
+    '''
+    width = max(width, 1)
+    if align_right:
+        padded = ''.join(digits.rjust(width, '0') for digits in digit_strings)
+    else:
+        padded = ''.join(digits.ljust(width, '0') for digits in digit_strings)
+    matrix = np.frombuffer(padded.encode('ascii'), dtype=np.uint8).reshape(len(digit_strings), width)
+    return matrix.astype(np.int64) - 48
+
+
+def _luhn_totals(digit_strings):
+    '''
+    Compute the Luhn checksum total (before taking it modulo 10) of each of a
+    list of strings of ASCII digits at once
+    Returns: NumPy integer array of totals
+    '''
+    digits = _digit_matrix(digit_strings, max(map(len, digit_strings)))[:, ::-1]
+    doubled = 2 * digits[:, 1::2]
+    # the sum of the digits of a doubled digit over 9 is 9 less than it
+    return digits[:, 0::2].sum(axis=1) + (doubled - 9 * (doubled > 9)).sum(axis=1)
+
 
 def check_age(possible_age):
     '''
@@ -35,6 +138,31 @@ def verify_cc_match(match):
     return False
 
 
+def _luhn_digits_check(prepared):
+    '''
+    Helper function for verify_cc_match_batch and south_africa_id_batch.
+    Returns the digits of each match that are a valid Luhn number of 12 to 19
+    digits with an accepted first digit, or False.
+    '''
+    digit_strings = [digits for _, digits in prepared]
+    totals = _luhn_totals(digit_strings)
+    return [digits if (digits[:1] in LUHN_PREFIXES and 12 <= len(digits) <= 19
+                       and total % 10 == 0) else False
+            for digits, total in zip(digit_strings, totals.tolist())]
+
+
+def verify_cc_match_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: credit card
+    Inputs:
+        matches: (list) CREDIT_CARD_NUMBER regex match strings
+    Returns: List of results for each match, as returned by verify_cc_match
+    '''
+    return _verify_vectorized(matches, verify_cc_match,
+                              lambda match: _NON_DIGIT.sub("", match),
+                              _luhn_digits_check)
+
+
 def check_mac_local(mac_address):
     '''
     Verify regex match ontains feasible PII of type: local MAC address
@@ -51,12 +179,41 @@ def check_mac_local(mac_address):
         return False
 
 
+def load_area_codes(filename=AREA_CODES_FILE, reload=False):
+    '''
+    Load valid US area codes from area_codes.json into an in-memory lookup.
+    The file is only read the first time this is called, and afterwards only
+    if reload is True and the file has been modified since it was last read.
+    Inputs:
+        filename: (str) Path to area code JSON file. Default is the
+            area_codes.json file shipped with this package.
+        reload: (boolean) Whether to re-read the file if it has changed.
+            Default is False.
+    Returns: frozenset of valid three digit US area code strings
+    '''
+    global _area_codes
+
+    if _area_codes is None or reload:
+        mtime = os.path.getmtime(filename)
+        if _area_codes is None or _area_codes[0] != mtime:
+            with open(filename) as f:
+                _area_codes = (mtime, frozenset(json.loads(f.read()).keys()))
+
+    return _area_codes[1]
+
+
+def reload_area_codes(filename=AREA_CODES_FILE):
+    '''
+    Refresh the in-memory area code lookup if area_codes.json has changed
+    '''
+    return load_area_codes(filename, reload=True)
+
+
 def verify_phone(possible_us):
     '''
     Verify regex match ontains feasible PII of type: US phone number
     '''
-    with open('area_codes.json') as f:
-        valid_us_codes = json.loads(f.read())
+    valid_us_codes = _area_codes[1] if _area_codes else load_area_codes()
 
     stripped = possible_us.replace('(', '').replace(')', '').replace('-', '').replace(' ', '')
     if len(stripped) >= 10:
@@ -71,7 +228,7 @@ def verify_phone(possible_us):
         if 100 <= int(stripped[-3:-1]) <= 199:
             return False
 
-    if area_code in valid_us_codes.keys():
+    if area_code in valid_us_codes:
         return possible_us
     else:
         return False
@@ -103,17 +260,37 @@ def extract_names(match):
     '''
     Verify regex match ontains feasible PII of type: name
     '''
-    token_line = nltk.sent_tokenize(match)
-    token_line = [nltk.word_tokenize(sent) for sent in token_line]
-    token_line = [nltk.pos_tag(sent) for sent in token_line][0]
+    return extract_names_batch([match])[0]
+
+
+def extract_names_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: name.
+    Each distinct match is tokenized, and all of them are POS tagged in a
+    single call.
+    Inputs:
+        matches: (list) NAME regex match strings
+    Returns: List of names extracted from each match, as returned by
+        extract_names
+    '''
+    # nltk is slow to import, so it is only imported once names are verified
+    import nltk
+
+    untagged = {}
+    for i, match in enumerate(matches):
+        untagged.setdefault(match, []).append(i)
+
+    names = [None] * len(matches)
+    # only the first sentence of a match is used to extract names
+    token_lines = [nltk.word_tokenize(nltk.sent_tokenize(match)[0])
+                   for match in untagged]
 
-    return " ".join((new_string for new_string, tag in token_line if tag in ("NNP", "NN")))
-    
-    # for (new_string, tag) in token_line:
-    #     if "NN" in tag:
-    #             name += new_string
-    #             name += " "
-    # return name
+    for indices, token_line in zip(untagged.values(), nltk.pos_tag_sents(token_lines)):
+        name = " ".join((new_string for new_string, tag in token_line if tag in ("NNP", "NN")))
+        for i in indices:
+            names[i] = name
+
+    return names
 
 
 def standardize_gender(possible_gender):
@@ -143,6 +320,30 @@ def dea_checksum(dea):
         return False
 
 
+# weights of the six digits before a DEA number's check digit
+DEA_WEIGHTS = [1, 2, 1, 2, 1, 2]
+
+
+def dea_checksum_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: Medical
+    Doctor DEA Registration Number
+    Inputs:
+        matches: (list) US_DEA_NUMBER regex match strings
+    Returns: List of results for each match, as returned by dea_checksum
+    '''
+    def prepare(dea):
+        v = dea[-7:-1]
+        return v if len(v) == 6 and v.isdigit() else None
+
+    def check(prepared):
+        totals = _digit_matrix([v for _, v in prepared], 6) @ np.array(DEA_WEIGHTS)
+        return [dea if dea[-1] == str(total % 10) else False
+                for (dea, _), total in zip(prepared, totals.tolist())]
+
+    return _verify_vectorized(matches, dea_checksum, prepare, check)
+
+
 def australia_tax(n):
     '''
     Verify regex match ontains feasible PII of type: Australia Tax ID
@@ -182,6 +383,33 @@ def sweden_id(match):
             return match
 
 
+def _prepare_checksum_digits(match):
+    '''
+    Helper function for batch checksum verifiers. Splits an ASCII match into
+    the digits before its last character and its last character as a check
+    digit, or returns None if its last character is not a digit.
+    '''
+    if not match[-1:].isdigit():
+        return None
+    return _NON_DIGIT.sub("", match[:-1]), int(match[-1])
+
+
+def sweden_id_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: Sweden
+    National ID
+    Inputs:
+        matches: (list) SWEDEN_NATIONAL_ID regex match strings
+    Returns: List of results for each match, as returned by sweden_id
+    '''
+    def check(prepared):
+        totals = _luhn_totals([digits for _, (digits, _) in prepared])
+        return [match if digits[:1] in LUHN_PREFIXES and total % 10 == checksum else None
+                for (match, (digits, checksum)), total in zip(prepared, totals.tolist())]
+
+    return _verify_vectorized(matches, sweden_id, _prepare_checksum_digits, check)
+
+
 def south_korea_id(match):
     '''
     Verify regex match ontains feasible PII of type: South Korea National ID
@@ -220,6 +448,19 @@ def south_africa_id(match):
         return False
 
 
+def south_africa_id_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: South Africa
+    National ID
+    Inputs:
+        matches: (list) SOUTH_AFRICA_NATIONAL_ID regex match strings
+    Returns: List of results for each match, as returned by south_africa_id
+    '''
+    return _verify_vectorized(matches, south_africa_id,
+                              lambda match: _NON_DIGIT.sub("", match),
+                              _luhn_digits_check)
+
+
 def verify_chinaid(match):
     '''
     Verify regex match ontains feasible PII of type: China National ID
@@ -324,6 +565,33 @@ def uk_nhs_id(match):
         elif remainder == checksum:
             return match
 
+
+NHS_WEIGHTS = [10, 9, 8, 7, 6, 5, 4, 3, 2]
+
+
+def uk_nhs_id_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: UK National
+    Health Services ID Number
+    Inputs:
+        matches: (list) UK_NHS_ID regex match strings
+    Returns: List of results for each match, as returned by uk_nhs_id
+    '''
+    def prepare(match):
+        values = _prepare_checksum_digits(match)
+        # uk_nhs_id weights the first nine digits, and fails with fewer
+        if values is None or len(values[0]) < 9:
+            return None
+        return values[0][:9], values[1]
+
+    def check(prepared):
+        totals = _digit_matrix([digits for _, (digits, _) in prepared], 9) @ np.array(NHS_WEIGHTS)
+        # as in uk_nhs_id, a remainder of 10 or 11 never equals a check digit
+        return [match if 11 - total % 11 == checksum else None
+                for (match, (_, checksum)), total in zip(prepared, totals.tolist())]
+
+    return _verify_vectorized(matches, uk_nhs_id, prepare, check)
+
 def canadian_insur_id(match):
     '''
     Verify regex match ontains feasible PII of type: Canadian Insurance Number
@@ -344,6 +612,26 @@ def canadian_insur_id(match):
     if total % 10 == 0:
         return match
 
+
+def canadian_insur_id_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: Canadian
+    Insurance Number
+    Inputs:
+        matches: (list) CANADIAN_INSURANCE_ID regex match strings
+    Returns: List of results for each match, as returned by canadian_insur_id
+    '''
+    def check(prepared):
+        digit_strings = [digits for _, digits in prepared]
+        digits = _digit_matrix(digit_strings, max(map(len, digit_strings)), align_right=False)
+        doubled = 2 * digits[:, 1::2]
+        totals = digits[:, 0::2].sum(axis=1) + (doubled - 9 * (doubled > 9)).sum(axis=1)
+        return [match if total % 10 == 0 else None
+                for (match, _), total in zip(prepared, totals.tolist())]
+
+    return _verify_vectorized(matches, canadian_insur_id,
+                              lambda match: _NON_DIGIT.sub("", match), check)
+
 def mexico_curp(match):
     '''
     Verify regex match ontains feasible PII of type: Mexico National ID
@@ -394,3 +682,45 @@ def polish_pesel(match):
 
     if remainder == checksum:
         return match
+
+
+PESEL_WEIGHTS = [1, 3, 7, 9, 1, 3, 7, 9, 1, 3]
+
+
+def polish_pesel_batch(matches):
+    '''
+    Verify a batch of regex matches contain feasible PII of type: Polish
+    National ID
+    Inputs:
+        matches: (list) POLISH_PESEL_ID regex match strings
+    Returns: List of results for each match, as returned by polish_pesel
+    '''
+    def prepare(match):
+        values = _prepare_checksum_digits(match)
+        # polish_pesel fails with more digits than weights
+        if values is None or len(values[0]) > len(PESEL_WEIGHTS):
+            return None
+        return values
+
+    def check(prepared):
+        digits = _digit_matrix([digits for _, (digits, _) in prepared], len(PESEL_WEIGHTS),
+                               align_right=False)
+        totals = digits @ np.array(PESEL_WEIGHTS)
+        return [match if 10 - total % 10 == checksum else None
+                for (match, (_, checksum)), total in zip(prepared, totals.tolist())]
+
+    return _verify_vectorized(matches, polish_pesel, prepare, check)
+
+
+# verification functions that can verify many regex matches in one call, used
+# by the scan engine in place of one call per match
+BATCH_VERIFIERS = {
+    extract_names: extract_names_batch,
+    verify_cc_match: verify_cc_match_batch,
+    south_africa_id: south_africa_id_batch,
+    sweden_id: sweden_id_batch,
+    canadian_insur_id: canadian_insur_id_batch,
+    polish_pesel: polish_pesel_batch,
+    uk_nhs_id: uk_nhs_id_batch,
+    dea_checksum: dea_checksum_batch
+    }
@@ -1,13 +1,49 @@
-import re
+import io
 import os
 import sys
 import json
-import nltk
+import mmap
 import argparse
 import warnings
 from collections import defaultdict
 
 from checkers.check_functions import *
+from scanning.buffer import LineIndex
+from scanning.cache import CACHE_POLICIES, MISSING, LRUCache
+from scanning.checkpoint import (AppendedLines, load_checkpoint, make_checkpoint,
+                                 resume_position, save_checkpoint)
+from scanning.engine import VERIFY_CACHE_SIZE, Prefilter, ScanEngine, ScanLimits
+from scanning.findings import Finding
+from scanning.overlap import OverlapResolver
+from scanning.parallel import imap_ordered, scan_parallel
+from scanning.stats import ScanStats
+from scanning.result_cache import RESULT_CACHE_BYTES, ResultCache, corpus_fingerprint
+from scanning.readers import (WINDOW_LENGTH, compression, iter_file_lines, iter_file_windows,
+                              iter_input_files, iter_text_lines, iter_text_windows, open_text)
+from scanning.redact import Redactor, load_hash_keys, parse_masks
+from scanning.structured import RECORD_READERS, SAMPLE_RECORDS, ColumnPruner
+from scanning.writers import FORMAT_EXTENSIONS, WRITERS, WRITER_EXTENSIONS, writer_format
+
+
+# compiled engines by selection of PII types, bounded so that long lived
+# callers scanning for many different selections (e.g. the scan service) do
+# not keep every engine they ever compiled
+ENGINE_CACHE_SIZE = 32
+_ENGINES = LRUCache(ENGINE_CACHE_SIZE)
+
+# matches within this many characters of the edge of a window of a long line
+# are left to the neighbouring window, which holds all of their context
+WINDOW_MARGIN = 21
+
+# compiled corpora and result cache of a worker process, set by _init_worker
+_worker_engine = None
+_worker_result_cache = None
+
+
+class PIIRecognitionError(Exception):
+    '''
+    Error raised by find_pii, where pii_finder would exit
+    '''
 
 
 def read_ascii(ascii_file, f=None, file_format=True):
@@ -22,17 +58,45 @@ def read_ascii(ascii_file, f=None, file_format=True):
     srting) as keys and a tuple of line text and line length (in characters)
     as values
     '''
+    text_as_str = stream_ascii(ascii_file, f=f, file_format=file_format)
+
+    # reformat lines of text into dictionary
+    try:
+        text_by_row = {row: (val, len(val)) for row, val in text_as_str}
+        return text_by_row
+    except Exception as e:
+        sys.exit(f"pii_recognition error: An error occurred when formatting text for PII parsing: {e}")
+
+
+def stream_ascii(ascii_file, f=None, file_format=True, window=None):
+    '''
+    Lazily read ASCII text string or ASCII text file line by line for PII
+    parsing and validation, keeping memory use flat regardless of input size.
+    gzip, bz2 and xz compressed files are decompressed as they are read.
+    Inputs:
+        ascii_file: (str) Valid filename, or a string of ASCII text. When f is
+            given, only used to name the input in error messages.
+        f: (I/O Object) File object to read from instead of opening
+            ascii_file, e.g. sys.stdin. Default is None.
+        file_format: (boolean) Whether ascii_file is a file name, or a string to
+            be parsed. Default is True.
+        window: (tuple) (maximum length, overlap) of the windows in which to
+            read long lines of a file. Default is None (lines are read whole).
+    Returns: Generator of (row number, line text) tuples, or if window is
+        given, of (row number, window text, position of the window in the
+        line, whether the window starts the line, whether it ends the line)
+        tuples, as returned by iter_file_windows
+    '''
     if ascii_file == '':
         sys.exit(f"pii_recognition error: No text detected for PII recognition. Please review text parameters.")
     if file_format:
         # test whether ascii_file is a valid file
         try:
-            # split file content by end of line characters
+            read = iter_file_lines if window is None else lambda f: iter_file_windows(f, *window)
             if not f:
-                with open(ascii_file, 'r') as f:
-                    text_as_str = f.read().split('\n')
+                return _stream_file(ascii_file, open_text(ascii_file), close=True, read=read)
             else:
-                text_as_str = f.read().split('\n')
+                return _stream_file(ascii_file, f, close=False, read=read)
         except FileNotFoundError:
             # if not, produce an error and exit
             sys.exit(f"pii_recognition file error: File {ascii_file} was not found.")
@@ -40,20 +104,68 @@ def read_ascii(ascii_file, f=None, file_format=True):
             # catch all other errors with a system exit
             sys.exit(f"pii_recognition error: An error occurred in accessing text in file '{ascii_file}': {e}")
     else:
-        try:
-            # if file_format is False, parse ASCII text as a string and split by
-            # end of line characters
-            text_as_str = ascii_file.split('\n')
-        except Exception as e:
-            # catch all other errors with a system exit
-            sys.exit(f"pii_recognition error: An error occurred in accessing text: {e}")
+        if not isinstance(ascii_file, str):
+            sys.exit(f"pii_recognition error: An error occurred in accessing text: expected a string, not {type(ascii_file).__name__}")
+
+        # if file_format is False, parse ASCII text as a string and split by
+        # end of line characters
+        if window is not None:
+            return iter_text_windows(ascii_file, *window)
+        return iter_text_lines(ascii_file)
 
-    # reformat list of text strings into dictionary
+
+def _stream_file(ascii_file, f, close, read=iter_file_lines):
+    '''
+    Helper function for stream_ascii and stream_records. Yields the lines
+    (or windows of lines, or records) read from an open file object by the
+    function read, closing it once exhausted if close is True.
+    '''
     try:
-        text_by_row = {row: (val, len(val)) for row, val in enumerate(text_as_str)}
-        return text_by_row
+        yield from read(f)
     except Exception as e:
-        sys.exit(f"pii_recognition error: An error occurred when formatting text for PII parsing: {e}")
+        sys.exit(f"pii_recognition error: An error occurred in accessing text in file '{ascii_file}': {e}")
+    finally:
+        if close:
+            f.close()
+
+
+def stream_records(ascii_file, input_format, f=None, file_format=True):
+    '''
+    Lazily read the records of a CSV or JSONL text string or text file, with
+    each record's fields named by column (or key), for PII parsing and
+    validation field by field. gzip, bz2 and xz compressed files are
+    decompressed as they are read.
+    Inputs:
+        ascii_file: (str) Valid filename, or a string of text. When f is
+            given, only used to name the input in error messages.
+        input_format: (str) 'csv' (with a header row of column names) or
+            'jsonl' (one JSON object per line, with nested keys flattened)
+        f: (I/O Object) File object to read from instead of opening
+            ascii_file, e.g. sys.stdin. Default is None.
+        file_format: (boolean) Whether ascii_file is a file name, or a string to
+            be parsed. Default is True.
+    Returns: Generator of (row number, list of (column, value) tuples) tuples
+    '''
+    if input_format not in RECORD_READERS:
+        sys.exit(f"pii_recognition error: Unknown input format '{input_format}'. "
+                 f"Choose from: {', '.join(RECORD_READERS)}")
+    if ascii_file == '':
+        sys.exit(f"pii_recognition error: No text detected for PII recognition. Please review text parameters.")
+    read = RECORD_READERS[input_format]
+    if file_format:
+        try:
+            if not f:
+                return _stream_file(ascii_file, open_text(ascii_file, newline=''), close=True, read=read)
+            else:
+                return _stream_file(ascii_file, f, close=False, read=read)
+        except FileNotFoundError:
+            sys.exit(f"pii_recognition file error: File {ascii_file} was not found.")
+        except Exception as e:
+            sys.exit(f"pii_recognition error: An error occurred in accessing text in file '{ascii_file}': {e}")
+    else:
+        if not isinstance(ascii_file, str):
+            sys.exit(f"pii_recognition error: An error occurred in accessing text: expected a string, not {type(ascii_file).__name__}")
+        return _stream_file('<text>', io.StringIO(ascii_file, newline=''), close=True, read=read)
 
 
 def format_plaintext(info_type, match_found, line_text, line_length, start, end):
@@ -84,6 +196,30 @@ def format_plaintext(info_type, match_found, line_text, line_length, start, end)
         return (info_type, match_found, f"{start} - {end}", line_text)
 
 
+def format_buffer_match(info_type, match_found, buf, line_start, line_length, start, end):
+    '''
+    Equivalent of format_plaintext for a PII match found in a buffer of ASCII
+    text, decoding only the surrounding text reported with the match
+    Inputs:
+        info_type: (str) Type of PII match found
+        match_found: (str) The text of a PII match
+        buf: (bytes-like) Buffer in which PII match was found
+        line_start: (int) Position in buf of the text line in which PII match
+            was found
+        line_length: (int) Length of text line in which PII match was found
+        start: (int) Starting character position in line text of PII match
+        end: (int) Ending character position in line text of PII match
+    Returns: PII match tuple, as format_plaintext
+    '''
+    if line_length > 50:
+        start_context, end_context = max(0, start - 20), min(line_length, end + 20)
+    else:
+        start_context, end_context = 0, line_length
+    context = buf[line_start + start_context:line_start + end_context].decode('ascii')
+
+    return (info_type, match_found, f"{start} - {end}", context)
+
+
 def parse_line(row, line_text, line_length, corpus, detected_dict, file_obj=None,
                 verify=False):
     '''
@@ -108,41 +244,88 @@ def parse_line(row, line_text, line_length, corpus, detected_dict, file_obj=None
             corpus. Default is False (REGEX_ONLY_CORPUS).
     Returns: An updated detected_dict
     '''
-    if verify:
-        for info_type, (pattern, verify_fcn) in corpus.items():
+    engine = compile_corpora([(corpus, verify)])
 
-            detected_row = []
-            for m in re.finditer(pattern, line_text):
-                if m and m.group(0).strip() != '':
-                    verified = verify_fcn(m.group(0).strip())
+    return scan_line(row, line_text, line_length, engine, detected_dict)
 
-                    if verified:
-                        detected_row.append(
-                            format_plaintext(info_type, verified,
-                                             line_text, line_length,
-                                             start=m.start(), end=m.end())
-                        )
-            if len(detected_row) > 0:
-                detected_dict[row][info_type] = detected_row
 
-    else:
-        for info_type, pattern in corpus.items():
+def compile_corpora(corpora, shared=True):
+    '''
+    Compile PII corpora into a reusable ScanEngine. The ENGINE_CACHE_SIZE
+    most recently used engines are cached, so each combination of corpora is
+    usually only compiled once per process.
+    Inputs:
+        corpora: (list) (corpus, verify) pairs, e.g.
+            [(REGEX_ONLY_CORPUS, False), (VERIFY_CORPUS, True)]
+        shared: (boolean) Whether to return the cached engine shared by every
+            caller, or a new engine of the caller's own, whose limits and
+            resolver can be set without affecting other scans. Default is
+            True.
+    Returns: ScanEngine object
+    '''
+    if not shared:
+        return ScanEngine(corpora, batch_verifiers=BATCH_VERIFIERS, prefilters=PREFILTERS)
+
+    # corpora are selected in corpus order, so each selection has one key
+    key = tuple((tuple(corpus.items()), verify) for corpus, verify in corpora)
+    engine = _ENGINES.get(key)
+    if engine is MISSING:
+        engine = ScanEngine(corpora, batch_verifiers=BATCH_VERIFIERS, prefilters=PREFILTERS)
+        _ENGINES.put(key, engine)
 
-            detected_row = []
-            for m in re.finditer(pattern, line_text):
-                if m and len(m.group(0).strip()) > 0:
-                    detected_row.append(
-                        format_plaintext(info_type, m.group(0).strip(),
-                                         line_text, line_length,
-                                         start=m.start(), end=m.end())
-                    )
+    return engine
 
-            if len(detected_row) > 0:
-                detected_dict[row][info_type] = detected_row
+
+def scan_line(row, line_text, line_length, engine, detected_dict):
+    '''
+    Helper function for pii_finder. Parses an individual line of text for PII
+    with every detector of a compiled ScanEngine, in a single pass per distinct
+    regex pattern.
+    Inputs:
+        row: (int) Text row number
+        line_text: (str) Text line in which PII match was found
+        line_length: (int) Length of text line in which PII match was found
+        engine: (ScanEngine) Compiled PII corpora
+        detected_dict: (dict) Dictionary containing row nunmbers as keys and
+            dictionaries of PII types and PII of each type found in that row
+            as values
+    Returns: An updated detected_dict
+    '''
+    results = engine.scan(line_text)
+
+    for info_type, hits in hits_by_type(engine, results).items():
+        detected_dict[row][info_type] = [
+            format_plaintext(info_type, value, line_text, line_length, start=start, end=end)
+            for value, start, end in hits
+        ]
 
     return detected_dict
 
 
+def hits_by_type(engine, results):
+    '''
+    Collect the matches found for each PII type in a line of text. Detectors
+    are applied in corpus order, so a PII type found by a later corpus
+    replaces the matches found for it by an earlier one, unless overlapping
+    matches are resolved, in which case the (disjoint) matches of every
+    corpus are kept.
+    Inputs:
+        engine: (ScanEngine) Compiled PII corpora
+        results: (list) Matches found by each detector, as returned by
+            engine.scan
+    Returns: Dictionary of PII types and lists of (value, start, end) tuples
+    '''
+    found = {}
+    for detector in engine.detectors:
+        hits = results[detector.index]
+        if not hits:
+            continue
+        if engine.resolver is not None and detector.info_type in found:
+            hits = sorted(found[detector.info_type] + hits, key=lambda hit: (hit[1], hit[2]))
+        found[detector.info_type] = hits
+    return found
+
+
 VERIFY_CORPUS = {
 
     'AGE': (r"(?<![\.\+\-\(])\b(\d{1,2}\s(years|ans|y.o.|años|anni|Jahre))(?![\-\:])\b|(?<![\.\+\-\(])(?=((Age|Alter)[\s\:]{0,2}))([0-1]\d{1,2})(?![\-\:])\b|(?<![\.\+\-\(])\b([0-1]?\d{1,2})(?![\-\:])\b|(?<![\.\+\-\(])\b([0]?[1-9]{1,2})(?![\-\:])\b", check_age),
@@ -185,72 +368,988 @@ REGEX_ONLY_CORPUS = {
 
 
 
-def pii_finder(ascii_file, output_file=None, file_format=True):
+# cheap tests of whether a line could contain a match for each PII type, run
+# before the PII type's regex. Keyed by PII type, so a prefilter must hold for
+# the PII type's pattern in every corpus (e.g. both PHONE_NUMBER_US patterns)
+ADDRESS_WORDS = ('road', 'street', 'avenue', 'boulevard', 'lane', 'drive', 'way',
+                 'court', 'plaza', 'terrace', 'colony', 'close')
+
+PREFILTERS = {
+    'AUSTRALIA_MEDICARE_NUMBER': Prefilter(min_digits=9),
+    'EMAIL_ADDRESS': Prefilter(required=('@', '.')),
+    'PHONE_NUMBER_INT': Prefilter(min_digits=10),
+    'FDA_CODE': Prefilter(min_digits=10, required=('-',)),
+    'ICD_CODE': Prefilter(min_digits=3),
+    'PHONE_NUMBER_US': Prefilter(min_digits=7),
+    'MAC_ADDRESS': Prefilter(keywords=(':', '-'), min_length=17),
+    'US_VIN_NUMBER': Prefilter(min_length=17),
+    'GERMANY_PASSPORT': Prefilter(min_length=9),
+    'FRANCE_PASSPORT': Prefilter(min_digits=7),
+    'UK_INSURANCE_ID': Prefilter(min_digits=6),
+    'PHYSICAL_ADDRESS': Prefilter(min_digits=1, keywords=ADDRESS_WORDS),
+    'AGE': Prefilter(min_digits=1),
+    'SSN': Prefilter(min_digits=9, required=('-',)),
+    'IP_ADDRESS': Prefilter(min_digits=12),
+    # 'female' and 'woman' contain 'male' and 'man'
+    'GENDER': Prefilter(keywords=('male', 'man', 'girl', 'boy')),
+    'CREDIT_CARD_NUMBER': Prefilter(min_digits=4, keywords=('-', '|', ',')),
+    'CHINA ID': Prefilter(min_digits=15),
+    'NAME': Prefilter(uppercase=True),
+    'MAC_ADDRESS_LOCAL': Prefilter(keywords=(':', '-'), min_length=17),
+    'SOUTH_AFRICA_NATIONAL_ID': Prefilter(min_digits=13),
+    'HONG_KONG_NATIONAL_ID': Prefilter(min_digits=7),
+    'US_DEA_NUMBER': Prefilter(min_digits=2),
+    'SWEDEN_NATIONAL_ID': Prefilter(min_digits=10),
+    'SPAIN_NIF_NUMBER': Prefilter(min_digits=8),
+    'SPAIN_NIE_NUMBER': Prefilter(min_digits=7),
+    'UK_NHS_ID': Prefilter(min_digits=10),
+    'CANADIAN_INSURANCE_ID': Prefilter(min_digits=9),
+    'MEXICAN_CURP_ID': Prefilter(min_digits=8, min_length=18),
+    'FRENCH_NATIONAL_INSEE_ID': Prefilter(min_digits=12),
+    'POLISH_PESEL_ID': Prefilter(min_digits=11)
+    }
+
+
+# corpora scanned by pii_finder, in the order their detectors are applied
+CORPORA = [(REGEX_ONLY_CORPUS, False), (VERIFY_CORPUS, True)]
+
+# every PII type that can be selected for scanning
+INFO_TYPES = list(dict.fromkeys(info_type for corpus, _ in CORPORA for info_type in corpus))
+
+
+def select_corpora(types=None, exclude_types=None):
+    '''
+    Restrict the PII corpora to selected PII types, so that only the selected
+    detectors are compiled and run
+    Inputs:
+        types: (list) PII types to scan for. Default is None (all types).
+        exclude_types: (list) PII types not to scan for. Default is None.
+    Returns: List of (corpus, verify) pairs, as CORPORA
+    '''
+    try:
+        return _select_corpora(types, exclude_types)
+    except PIIRecognitionError as e:
+        sys.exit(f"pii_recognition error: {e}")
+
+
+def _select_corpora(types=None, exclude_types=None):
+    '''
+    Helper function for select_corpora and find_pii. Raises
+    PIIRecognitionError for unknown or empty selections of PII types.
+    '''
+    if not types and not exclude_types:
+        return CORPORA
+
+    selected = set(types or INFO_TYPES) - set(exclude_types or [])
+
+    unknown = (set(types or []) | set(exclude_types or [])) - set(INFO_TYPES)
+    if unknown:
+        raise PIIRecognitionError(f"Unknown PII type(s) {', '.join(sorted(unknown))}. "
+                                  f"Valid types are: {', '.join(INFO_TYPES)}.")
+    if not selected:
+        raise PIIRecognitionError(f"No PII types selected for PII recognition.")
+
+    return [({info_type: entry for info_type, entry in corpus.items() if info_type in selected}, verify)
+            for corpus, verify in CORPORA]
+
+
+def scan_rows(text_by_row, engine, redactor=None):
+    '''
+    Parse numbered rows of text for PII
+    Inputs:
+        text_by_row: (iterable) (row number, line text) tuples, e.g. as
+            returned by stream_ascii
+        engine: (ScanEngine) Compiled PII corpora
+        redactor: (Redactor) Writer of a redacted copy of the text, to which
+            every row is written as it is scanned. Default is None.
+    Returns: Generator of (row number, dictionary of PII types and PII of
+        each type found in that row) tuples, for rows in which PII was found
+    '''
+    # initiate dictionary to capture findings
+    detected = defaultdict(dict)
+
+    for row, line_text in text_by_row:
+        line_length = len(line_text)
+
+        try:
+            # parse row for PII types that are determined solely by Regex, and
+            # those that require verification via an additional function
+            detected = scan_line(row, line_text, line_length, engine,
+                                 detected_dict=detected)
+        except Exception as e:
+            sys.exit(f"pii_recognition error: An error occurred during text parsing in row {row}: {e}")
+
+        for info_type in engine.overruns:
+            print(f"pii_recognition warning: {info_type} exceeded its {engine.limits.budget}s budget "
+                  f"in row {row} (length {line_length}); its matches in this row were skipped.",
+                  file=sys.stderr)
+
+        # drop each row once returned, so findings are not held in memory for
+        # the whole file
+        found = detected.pop(row, None)
+        if redactor is not None:
+            redactor.write_line(line_text, found)
+        if found:
+            yield row, found
+
+
+def scan_window(engine):
+    '''
+    Returns: Tuple of the maximum length and overlap of the windows in which
+        to read long lines, from the engine's scan limits if set
+    '''
+    limits = engine.limits
+    if limits is not None and limits.max_line_length is not None:
+        return limits.max_line_length, limits.overlap
+    return WINDOW_LENGTH, ScanLimits().overlap
+
+
+def scan_windows(windows, engine, context=True):
+    '''
+    Parse numbered rows of text read in bounded windows for PII, so that lines
+    of any length (e.g. minified JSON, or a CSV file without end of line
+    characters) are scanned without holding them in memory whole. Matches
+    found in two overlapping windows are only reported once, with positions
+    in the whole line.
+    Inputs:
+        windows: (iterable) (row number, window text, position of the
+            window in the line, whether the window starts the line, whether
+            it ends the line) tuples, e.g. as returned by stream_ascii with
+            window
+        engine: (ScanEngine) Compiled PII corpora
+        context: (boolean) Whether to format each match with its surrounding
+            text, as format_plaintext does, or to report it as an
+            (info_type, value, start, end) hit, e.g. for columnar output.
+            Default is True.
+    Returns: Generator of (row number, dictionary of PII types and PII of
+        each type found in that row) tuples, for rows in which PII was found,
+        as scan_rows
+    '''
+    for row, text, offset, at_start, at_end in windows:
+        if at_start:
+            # formatted matches found in the row by each detector
+            results = [[] for _ in engine.detectors]
+            seen = None if at_end else set()
+        else:
+            # matches starting before this window cannot be found again
+            seen = {key for key in seen if key[1] >= offset}
+
+        text_length = len(text)
+        try:
+            window_results = engine.scan_window(text, offset, at_start, at_end, seen,
+                                                margin=WINDOW_MARGIN)
+        except Exception as e:
+            sys.exit(f"pii_recognition error: An error occurred during text parsing in row {row}: {e}")
+
+        for info_type in engine.overruns:
+            print(f"pii_recognition warning: {info_type} exceeded its {engine.limits.budget}s budget "
+                  f"in row {row} (at position {offset}); its matches in this window were skipped.",
+                  file=sys.stderr)
+
+        for detector in engine.detectors:
+            for value, start, end in window_results[detector.index]:
+                if not context:
+                    results[detector.index].append(((detector.info_type, value, start, end), start, end))
+                    continue
+                # matches are far enough from the edges of windows within a
+                # line that their context lies within the window
+                match = format_plaintext(detector.info_type, value, text, text_length,
+                                         start=start - offset, end=end - offset)
+                if offset:
+                    match = (detector.info_type, value, f"{start} - {end}", match[3])
+                results[detector.index].append((match, start, end))
+
+        if at_end:
+            found = {info_type: [match for match, _, _ in hits]
+                     for info_type, hits in hits_by_type(engine, results).items()}
+            if found:
+                yield row, found
+
+
+def scan_records(records, engine, pruner=None, context=True):
+    '''
+    Parse numbered records of structured text for PII field by field, so that
+    matches never run across fields and are reported by column (or key)
+    Inputs:
+        records: (iterable) (row number, list of (column, value) tuples)
+            tuples, e.g. as returned by stream_records
+        engine: (ScanEngine) Compiled PII corpora
+        pruner: (ColumnPruner) Chooser of the detectors to run in each
+            column, learned from the first records. Default is None (every
+            detector runs in every column).
+        context: (boolean) Whether to format each match with its surrounding
+            text, or to report it as an (info_type, value, start, end) hit,
+            as scan_windows. Default is True.
+    Returns: Generator of (row number, dictionary of PII types and PII of
+        each type found in that record) tuples, for records in which PII was
+        found, as scan_rows, with each PII match tuple followed by the column
+        it was found in
+    '''
+    for row, fields in records:
+        found = {}
+        for column, value in fields:
+            if not value:
+                continue
+            scans = pruner.scans_for(column) if pruner is not None else None
+            try:
+                results = engine.scan(value, scans)
+            except Exception as e:
+                sys.exit(f"pii_recognition error: An error occurred during text parsing in row {row} "
+                         f"(column '{column}'): {e}")
+
+            for info_type in engine.overruns:
+                print(f"pii_recognition warning: {info_type} exceeded its {engine.limits.budget}s budget "
+                      f"in row {row} (column '{column}'); its matches in this field were skipped.",
+                      file=sys.stderr)
+
+            if pruner is not None:
+                pruner.observe(column, results)
+            value_length = len(value)
+            for info_type, hits in hits_by_type(engine, results).items():
+                if not context:
+                    found.setdefault(info_type, []).extend(
+                        (info_type, match, start, end, column) for match, start, end in hits)
+                    continue
+                found.setdefault(info_type, []).extend(
+                    format_plaintext(info_type, match, value, value_length, start=start, end=end) + (column,)
+                    for match, start, end in hits)
+
+        if pruner is not None:
+            pruner.end_record()
+        if found:
+            yield row, found
+
+
+def find_pii(ascii_file, file_format=True, f=None, types=None, exclude_types=None,
+             limits=None, resolver=None):
+    '''
+    Parse text in a given ASCII text file or text string for potential PII,
+    for use as a library. Unlike pii_finder, nothing is written to a file,
+    and errors raise exceptions rather than exiting.
+    Inputs:
+        ascii_file: (str) Valid filename, or a string of ASCII text
+        file_format: (boolean) Whether ascii_file is a file name, or a string to
+            be parsed. Default is True.
+        f: (I/O Object) File object to read text from instead of opening
+            ascii_file, e.g. sys.stdin. Default is None.
+        types: (list) PII types to scan for. Default is None (all types).
+        exclude_types: (list) PII types not to scan for. Default is None.
+        limits: (ScanLimits) Hardened mode limits, as pii_finder. Matches
+            skipped for running over budget are reported with a
+            RuntimeWarning. Default is None.
+        resolver: (OverlapResolver) Resolver of overlapping matches, as
+            pii_finder. Default is None.
+    Returns: Generator of Finding records, in row order, with PII types in
+        each row ordered and replaced between corpora as in pii_finder output
+    Raises: PIIRecognitionError for invalid PII types or errors during
+        parsing, and OSError or UnicodeDecodeError if ascii_file cannot be
+        read
+    '''
+    # limits and resolvers are set on an engine of this scan's own, so that
+    # scans running interleaved with it are unaffected
+    engine = compile_corpora(_select_corpora(types, exclude_types),
+                             shared=limits is None and resolver is None)
+
+    if not file_format:
+        if not isinstance(ascii_file, str):
+            raise PIIRecognitionError(f"Expected a string of text, not {type(ascii_file).__name__}.")
+        yield from _find_rows(ascii_file, iter_text_windows, engine, limits, resolver)
+    elif f is not None:
+        yield from _find_rows(f, iter_file_windows, engine, limits, resolver)
+    else:
+        with open_text(ascii_file) as f:
+            yield from _find_rows(f, iter_file_windows, engine, limits, resolver)
+
+
+def _find_rows(text, read, engine, limits, resolver):
+    '''
+    Helper function for find_pii. Parses text, read in bounded windows by the
+    function read (as scan_windows), for PII with a compiled ScanEngine,
+    within any scan limits and resolving any overlaps. The engine must not be
+    shared if limits or resolver are given. Findings in lines read in more
+    than one window hold only their context rather than the whole line.
+    '''
+    if limits is not None:
+        engine.set_limits(limits)
+    if resolver is not None:
+        engine.set_resolver(resolver)
+    try:
+        for row, window_text, offset, at_start, at_end in read(text, *scan_window(engine)):
+            if at_start:
+                # (value, start, end, line, line offset) of matches found in
+                # the row by each detector
+                results = [[] for _ in engine.detectors]
+                seen = None if at_end else set()
+            else:
+                # matches starting before this window cannot be found again
+                seen = {key for key in seen if key[1] >= offset}
+
+            try:
+                window_results = engine.scan_window(window_text, offset, at_start, at_end, seen,
+                                                    margin=WINDOW_MARGIN)
+            except Exception as e:
+                raise PIIRecognitionError(f"An error occurred during text parsing in row {row}: {e}") from e
+
+            for info_type in engine.overruns:
+                warnings.warn(f"{info_type} exceeded its {engine.limits.budget}s budget in row {row}; "
+                              f"its matches in this row were skipped.", RuntimeWarning)
+
+            whole = at_start and at_end
+            for detector in engine.detectors:
+                for value, start, end in window_results[detector.index]:
+                    if whole:
+                        results[detector.index].append((value, start, end, window_text, 0))
+                    else:
+                        # keep only the context, so that windows are not held
+                        context_start = max(0, start - offset - 20)
+                        results[detector.index].append(
+                            (value, start, end, window_text[context_start:end - offset + 20],
+                             offset + context_start))
+
+            if at_end:
+                for info_type, hits in hits_by_type(engine, results).items():
+                    for value, start, end, line, line_offset in hits:
+                        yield Finding(row, info_type, value, start, end, line, line_offset)
+    finally:
+        if limits is not None:
+            engine.set_limits(None)
+
+
+def scan_mapped(ascii_file, engine, block_rows=10000):
+    '''
+    Parse a text file for PII by memory mapping it and scanning blocks of rows
+    of the mapped file with each distinct pattern at once, instead of decoding
+    and splitting the whole file into lines. Rows containing non-ASCII text
+    are decoded and scanned line by line as usual.
+    Inputs:
+        ascii_file: (str) Valid filename
+        engine: (ScanEngine) Compiled PII corpora
+        block_rows: (int) Number of rows to scan at once. Default is 10000.
+    Returns: Generator of (row number, dictionary of PII types and PII of
+        each type found in that row) tuples, for rows in which PII was found,
+        as scan_rows, or None if the file cannot be memory mapped (e.g. it is
+        empty, or compressed) or uses carriage returns alone as ends of lines
+    '''
+    try:
+        if compression(ascii_file):
+            return None
+        with open(ascii_file, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        sys.exit(f"pii_recognition file error: File {ascii_file} was not found.")
+    except (ValueError, OSError):
+        return None
+
+    index = LineIndex(buf)
+    if index.has_lone_returns():
+        buf.close()
+        return None
+
+    return _scan_mapped(ascii_file, buf, index, engine, block_rows)
+
+
+def _scan_mapped(ascii_file, buf, index, engine, block_rows):
+    '''
+    Helper function for scan_mapped. Scans a memory mapped file block by
+    block, closing it once exhausted.
+    '''
+    try:
+        for first_row in range(0, len(index), block_rows):
+            last_row = min(first_row + block_rows, len(index))
+            text_rows = index.unsafe_rows(index.start(first_row), index.end(last_row - 1))
+            found_by_row = engine.scan_buffer(buf, index, first_row, last_row,
+                                              skip_rows=text_rows)
+
+            # rows that cannot be scanned as bytes are decoded and scanned as text
+            texts = {}
+            for row in text_rows:
+                texts[row] = buf[index.start(row):index.end(row)].decode()
+                found_by_row[row] = engine.scan(texts[row])
+
+            for row in sorted(found_by_row):
+                results = found_by_row[row]
+                line_start = index.start(row)
+                line_length = len(texts[row]) if row in texts else index.end(row) - line_start
+
+                # as scan_line, a PII type found by a later corpus replaces the
+                # matches found for it by an earlier one
+                found = {}
+                for detector in engine.detectors:
+                    hits = results[detector.index]
+                    if not hits:
+                        continue
+                    if row in texts:
+                        found[detector.info_type] = [
+                            format_plaintext(detector.info_type, value, texts[row], line_length,
+                                             start=start, end=end)
+                            for value, start, end in hits]
+                    else:
+                        found[detector.info_type] = [
+                            format_buffer_match(detector.info_type, value, buf, line_start,
+                                                line_length, start, end)
+                            for value, start, end in hits]
+
+                if found:
+                    yield row, found
+
+    except Exception as e:
+        sys.exit(f"pii_recognition error: An error occurred during text parsing of file '{ascii_file}': {e}")
+    finally:
+        buf.close()
+
+
+def lookup_results(result_cache, ascii_file, engine):
+    '''
+    Look up the findings for a file in a result cache
+    Inputs:
+        result_cache: (ResultCache) Persistent cache of findings
+        ascii_file: (str) Valid filename
+        engine: (ScanEngine) Compiled PII corpora the file is scanned with
+    Returns: Tuple of key with which to store the file's findings, and list of
+        cached (row number, dictionary of PII found) tuples, or None if the
+        file's findings are not cached
+    '''
+    try:
+        return result_cache.lookup(ascii_file, corpus_fingerprint(engine, data_files=[AREA_CODES_FILE]))
+    except FileNotFoundError:
+        sys.exit(f"pii_recognition file error: File {ascii_file} was not found.")
+    except Exception as e:
+        sys.exit(f"pii_recognition error: An error occurred in reading result cache '{result_cache.path}': {e}")
+
+
+def resume_appended(ascii_file, checkpoint_file):
+    '''
+    Open a file to scan from where the scan recorded in a checkpoint ended,
+    or from the start if there is no checkpoint or the file has since been
+    rotated, truncated or rewritten
+    Inputs:
+        ascii_file: (str) Valid filename
+        checkpoint_file: (str) Checkpoint file, which need not exist yet
+    Returns: Tuple of AppendedLines over the lines of ascii_file not yet
+        scanned, and whether the scan resumes from a checkpoint (in which
+        case findings should be appended to those of earlier scans, rather
+        than replace them)
+    '''
+    try:
+        if compression(ascii_file):
+            sys.exit(f"pii_recognition error: Compressed file '{ascii_file}' cannot be scanned incrementally.")
+        f = open(ascii_file, 'rb')
+    except FileNotFoundError:
+        sys.exit(f"pii_recognition file error: File {ascii_file} was not found.")
+
+    try:
+        checkpoint = load_checkpoint(checkpoint_file)
+        offset, row, restart = resume_position(ascii_file, f, checkpoint)
+    except Exception as e:
+        f.close()
+        sys.exit(f"pii_recognition error: An error occurred in reading checkpoint file '{checkpoint_file}': {e}")
+
+    if restart:
+        print(f"pii_recognition warning: {restart} since the last scan, scanning '{ascii_file}' from the start.",
+              file=sys.stderr)
+
+    return AppendedLines(f, offset, row), checkpoint is not None and restart is None
+
+
+def _init_worker(corpora=None, collect_stats=False, limits=None, verify_cache=None,
+                 result_cache=None, resolver=None):
+    '''
+    Worker process initializer for parallel scans. Compiles the PII corpora
+    and, when NAME is scanned for, loads NLTK's tokenizer and tagger models
+    once per worker, rather than once per chunk of rows or file.
+    Inputs:
+        corpora: (list) (corpus, verify) pairs to scan with. Default is None
+            (CORPORA).
+        collect_stats: (boolean) Whether to time detectors and return scan
+            statistics with results. Default is False.
+        limits: (ScanLimits) Time budget and line windowing limits to scan
+            with. Default is None.
+        verify_cache: (tuple) Maximum size and eviction policy of the
+            verifier result caches. Default is None (the engine's default).
+        result_cache: (ResultCache) Persistent cache of findings by file
+            contents. Default is None.
+        resolver: (OverlapResolver) Resolver of overlapping matches. Default
+            is None (every match is reported).
+    '''
+    global _worker_engine, _worker_result_cache
+    _worker_engine = compile_corpora(corpora or CORPORA)
+    _worker_result_cache = result_cache
+    _worker_engine.timing = collect_stats
+    _worker_engine.stats.reset()
+    _worker_engine.set_limits(limits)
+    _worker_engine.set_resolver(resolver)
+    if verify_cache is not None:
+        _worker_engine.set_verify_cache(*verify_cache)
+    if any(detector.verify_fcn is extract_names for detector in _worker_engine.detectors):
+        try:
+            extract_names_batch(["Worker Warm Up"])
+        except Exception:
+            # a model that cannot be loaded fails the scan itself on its
+            # first NAME match, with the scan's own error handling
+            pass
+
+
+def _reset_worker():
+    '''
+    Forget the engine and result cache set by _init_worker, once files have
+    been scanned in the current process, so that later scans in the process
+    do not pick them up
+    '''
+    global _worker_engine, _worker_result_cache
+    _worker_engine = None
+    _worker_result_cache = None
+
+
+def _worker_stats():
+    '''
+    Returns: Scan statistics collected by a worker since they were last
+        returned, or None if the worker is not collecting statistics
+    '''
+    if _worker_engine is not None and _worker_engine.timing:
+        return _worker_engine.stats.take()
+    return None
+
+
+def _scan_chunk(chunk):
+    '''
+    Helper function for parallel scans. Parses a chunk of numbered rows of
+    text for PII in a worker process.
+    Inputs:
+        chunk: (list) (row number, line text) tuples
+    Returns: Tuple of list of (row number, dictionary of PII found) tuples,
+        and scan statistics for the chunk (None unless collecting statistics)
+    '''
+    found = list(scan_rows(chunk, _worker_engine or compile_corpora(CORPORA)))
+    return found, _worker_stats()
+
+
+def pii_finder(ascii_file, output_file=None, file_format=True, f=None,
+               output_format=None, workers=1, types=None, exclude_types=None,
+               stats=False, stats_callback=None, limits=None, use_mmap=False,
+               verify_cache=None, checkpoint_file=None, result_cache=None,
+               redact_file=None, masks=None, resolver=None, input_format=None,
+               sample_records=SAMPLE_RECORDS):
     '''
     Parse text in a given ASCII text file or text string for potential PII
     Inputs:
         ascii_file: (str) Valid filename, or a string of ASCII text
-        output_file: (str) JSON file to which dictionary of PII recognized in
-            ascii_file should be written
+        output_file: (str) JSON, NDJSON or columnar file to which PII
+            recognized in ascii_file should be written, or '-' to write to
+            standard output
         file_format: (boolean) Whether ascii_file is a file name, or a string to
             be parsed. Default is True.
-    Returns: None. Writes output to output_file.
+        f: (I/O Object) File object to read text from instead of opening
+            ascii_file, e.g. sys.stdin. Default is None.
+        output_format: (str) Output format, one of WRITERS ('json',
+            'ndjson' or 'columnar'). Default is None, in which case it is
+            determined by the output file extension.
+        workers: (int) Number of worker processes to scan text with. Default
+            is 1, which scans text in the current process.
+        types: (list) PII types to scan for. Default is None (all types).
+        exclude_types: (list) PII types not to scan for. Default is None.
+        stats: (boolean) Whether to collect per detector timings and counters.
+            Default is False.
+        stats_callback: (function) Function called with the dictionary of
+            scan statistics once the scan is complete. Implies stats. Default
+            is None.
+        limits: (ScanLimits) Hardened mode limits: a time budget for each
+            detector on each line, and a maximum line length above which lines
+            are scanned in overlapping windows. Default is None.
+        use_mmap: (boolean) Whether to memory map ascii_file and scan it as a
+            whole (see scan_mapped), rather than line by line. Only applies
+            to files scanned in the current process without limits. Default
+            is False.
+        verify_cache: (tuple) (maximum size, eviction policy) of the cache
+            of verified results each detector keeps, so that values repeated
+            throughout the text are only verified once, e.g. (4096, 'lru').
+            A size of 0 disables caching. Default is None, which keeps the
+            current cache (of VERIFY_CACHE_SIZE entries, least recently used
+            first evicted).
+        checkpoint_file: (str) File recording how much of ascii_file has been
+            scanned. If given, only lines appended to ascii_file since the
+            checkpoint was saved are scanned, and their findings are appended
+            to output_file (which must be NDJSON). If ascii_file has been
+            rotated, truncated or rewritten since, it is scanned from the
+            start. Default is None (ascii_file is scanned in full).
+        result_cache: (ResultCache) Persistent cache of findings by file
+            contents, from which the findings of an unchanged ascii_file are
+            replayed rather than scanned again. Not used for text strings,
+            incremental scans or scans with limits. Default is None.
+        redact_file: (str) File to which to write a copy of the text with
+            the PII found masked, in the same pass as the scan. Overlapping
+            PII in a line is masked as one span. Not used with workers or
+            checkpoint_file, and implies that neither the result cache nor
+            memory mapping is used. Default is None.
+        masks: (dict) Masks by PII type for redact_file, e.g. {'SSN':
+            'partial:4', 'EMAIL_ADDRESS': 'hash', '*': 'token'} (see
+            scanning.redact.mask_text). Hash masks are keyed with the
+            PII_HASH_KEY environment variable, or with the contents of
+            KEYFILE for 'hash:KEYFILE' masks. Default is None ('token' for every
+            PII type).
+        resolver: (OverlapResolver) Resolver of overlapping matches, so that
+            each span of text in a line is reported as a single PII type.
+            Default is None (every match is reported).
+        input_format: (str) 'csv' or 'jsonl' to scan ascii_file as
+            structured records field by field, reporting the column (or key)
+            of each match (see stream_records). Not used with workers,
+            checkpoint_file or redact_file, and implies that neither the
+            result cache nor memory mapping is used. Default is None (plain
+            text, scanned line by line).
+        sample_records: (int) Number of records of structured input from
+            which to learn which PII types can be found in each column, after
+            which every other PII type is no longer scanned for in that
+            column. 0 scans every column for every PII type throughout.
+            Default is SAMPLE_RECORDS.
+    Returns: None, or a dictionary of scan statistics (as returned by
+        ScanStats.report) if collecting statistics. Writes output to
+        output_file.
     '''
-    # return ascii text as dictionary of numbered rows
     if not output_file:
         sys.exit(f"pii_recognition output error: PII must written to a file.")
 
-    else:
+    output_format = writer_format(output_file, output_format)
+    if not output_format:
+        _, ext = os.path.splitext(output_file)
+        sys.exit(f"pii_recognition output file error: Output file must be one of "
+                 f"{', '.join(WRITER_EXTENSIONS)} files, not '{ext}'.")
+
+    if checkpoint_file is not None:
+        if not file_format or f is not None:
+            sys.exit(f"pii_recognition error: Only files can be scanned incrementally from a checkpoint.")
+        if not WRITERS[output_format].appendable:
+            sys.exit(f"pii_recognition output error: Findings of incremental scans can only be appended to NDJSON output.")
+
+    if redact_file is not None:
+        if workers > 1 or checkpoint_file is not None:
+            sys.exit(f"pii_recognition error: Redaction cannot be combined with workers or incremental scans.")
+        if file_format and f is None and os.path.abspath(redact_file) == os.path.abspath(ascii_file):
+            sys.exit(f"pii_recognition output error: Redacted text cannot be written over the file being scanned.")
         try:
-            _, ext = os.path.splitext(output_file)
+            hash_keys = load_hash_keys(masks)
+        except (OSError, ValueError) as e:
+            sys.exit(f"pii_recognition error: {e}.")
 
-            if ext != '.json':
-                sys.exit(f"pii_recognition output file error: Output file must be a '.json' file, not '{ext}'.")
+    if input_format is not None:
+        if workers > 1 or checkpoint_file is not None or redact_file is not None:
+            sys.exit(f"pii_recognition error: Structured input cannot be combined with workers, "
+                     f"incremental scans or redaction.")
+        if sample_records < 0:
+            sys.exit(f"pii_recognition error: The number of sampled records cannot be negative.")
 
-            text_by_row = read_ascii(ascii_file, file_format=file_format)
+    corpora = select_corpora(types, exclude_types)
+    engine = compile_corpora(corpora)
+    collect_stats = stats or stats_callback is not None
 
-            # initiate dictionary to capture findings
-            detected = defaultdict(dict)
-            
-            # open output file
-            o = open(output_file, 'w')
+    if collect_stats:
+        scan_stats = ScanStats([detector.info_type for detector in engine.detectors])
+        engine.stats.reset()
+        engine.timing = workers <= 1
+    if limits is not None and workers <= 1:
+        engine.set_limits(limits)
+    if verify_cache is not None and workers <= 1:
+        previous_cache = engine.verify_cache
+        engine.set_verify_cache(*verify_cache)
+    if resolver is not None and workers <= 1:
+        engine.set_resolver(resolver)
 
-            # open list in JSON file
-            o.write("[{")
-            for row, (line_text, line_length) in text_by_row.items():
+    appended = redacted = None
+    try:
+        found_by_row = None
+        output_mode = 'w'
+        recorded = cache_key = None
+        if checkpoint_file is not None:
+            # continue from the end of the previous scan, appending findings
+            # to those it wrote
+            appended, resumed = resume_appended(ascii_file, checkpoint_file)
+            text_by_row = appended
+            output_mode = 'a' if resumed else 'w'
+        elif redact_file is not None:
+            # every line is written to the redacted copy as it is scanned
+            redacted = open(redact_file, 'w')
+        elif input_format is not None:
+            # scan each field of each record, skipping the PII types not found
+            # in a column's first records
+            records = stream_records(ascii_file, input_format, f=f, file_format=file_format)
+            found_by_row = scan_records(records, engine, ColumnPruner(engine, sample_records),
+                                        context=WRITERS[output_format].context)
+        else:
+            if (result_cache is not None and file_format and f is None
+                    and limits is None and engine.limits is None):
+                cache_key, found_by_row = lookup_results(result_cache, ascii_file, engine)
+                # record the findings of files not yet cached
+                recorded = [] if found_by_row is None else None
 
-                try:
-                    # parse row for PII types that are determined solely by Regex
-                    detected =  parse_line(row, line_text, line_length, corpus=REGEX_ONLY_CORPUS,
-                                           detected_dict=detected, file_obj=o, verify=False)
+            if (found_by_row is None and use_mmap and file_format and f is None and workers <= 1
+                    and limits is None and engine.resolver is None):
+                found_by_row = scan_mapped(ascii_file, engine)
 
-                    # parse row for PII types that require verification via an additional function
-                    detected = parse_line(row, line_text, line_length, corpus=VERIFY_CORPUS,
-                                          detected_dict=detected, file_obj=o, verify=True)
-                except Exception as e:
-                    sys.exit(f"pii_recognition error: An error occurred during text parsing in row {row}: {e}")
+        if found_by_row is None and appended is None and workers <= 1 and redacted is None:
+            # stream ascii text as numbered rows, reading long lines in
+            # bounded windows
+            windows = stream_ascii(ascii_file, f=f, file_format=file_format,
+                                   window=scan_window(engine))
+            # matches are only formatted with their context for output that
+            # holds it, or for findings recorded in the result cache
+            found_by_row = scan_windows(windows, engine,
+                                        context=WRITERS[output_format].context or recorded is not None)
 
-                if detected[row]:
-                    o.write(f'"{str(row)}":')
-                    o.write(json.dumps(detected[row]))
-                    o.write(",\n")
+        elif found_by_row is None:
+            if appended is None:
+                # stream ascii text as numbered rows
+                text_by_row = stream_ascii(ascii_file, f=f, file_format=file_format)
+            if workers > 1:
+                # scan chunks of rows in worker processes, collecting results
+                # in row order
+                found_by_row = scan_parallel(text_by_row, _scan_chunk, workers,
+                                             initializer=_init_worker,
+                                             initargs=(corpora, collect_stats, limits,
+                                                       verify_cache, None, resolver),
+                                             merge_stats=scan_stats.merge if collect_stats else None)
+            else:
+                redactor = Redactor(redacted, masks, hash_keys) if redacted is not None else None
+                found_by_row = scan_rows(text_by_row, engine, redactor)
 
-        except Exception as e:
-            sys.exit(f"pii_recognition error: An error occurred when writing to output file '{output_file}': {e}")
+        # open output file
+        o = sys.stdout if output_file == '-' else open(output_file, output_mode)
+        writer = WRITERS[output_format](o)
 
         try:
-            # once all rows written, remove last comma by seeking to end of file
-            o.seek(0, os.SEEK_END)
-            o.seek(o.tell() - 3, os.SEEK_SET)
+            writer.open()
+            for row, found in found_by_row:
+                writer.write_row(row, found)
+                if recorded is not None:
+                    recorded.append((row, found))
+
+        finally:
+            # complete output even if the scan ends early, so that it stays valid
+            writer.close()
+            if o is not sys.stdout:
+                o.close()
+
+        if recorded is not None:
+            result_cache.store(cache_key, recorded)
+
+        # only checkpoint scans that completed, so an interrupted scan is
+        # repeated in full next time
+        if appended is not None:
+            save_checkpoint(checkpoint_file, make_checkpoint(ascii_file, appended.f,
+                                                             appended.offset, appended.row))
+
+    except Exception as e:
+        sys.exit(f"pii_recognition error: An error occurred when writing to output file '{output_file}': {e}")
+
+    finally:
+        if appended is not None:
+            appended.f.close()
+        if redacted is not None:
+            redacted.close()
+        if collect_stats:
+            engine.timing = False
+        if limits is not None:
+            engine.set_limits(None)
+        if verify_cache is not None and workers <= 1:
+            engine.set_verify_cache(*previous_cache)
+        if resolver is not None and workers <= 1:
+            engine.set_resolver(None)
+
+    if collect_stats:
+        if workers <= 1:
+            scan_stats.merge(engine.stats.take())
+        report = scan_stats.report()
+        if stats_callback is not None:
+            stats_callback(report)
+        return report
+
+
+def _scan_file(path):
+    '''
+    Helper function for pii_finder_batch. Parses a single file for PII.
+    Inputs:
+        path: (str) Valid filename
+    Returns: Tuple of path, list of (row number, dictionary of PII found)
+        tuples, an error message (None if the file was scanned), and scan
+        statistics (None unless collecting statistics)
+    '''
+    engine = _worker_engine or compile_corpora(CORPORA)
+    cache = _worker_result_cache if engine.limits is None else None
+    try:
+        if cache is not None:
+            cache_key, found = lookup_results(cache, path, engine)
+            if found is not None:
+                return path, found, None, _worker_stats()
+
+        found = list(scan_windows(stream_ascii(path, window=scan_window(engine)), engine))
+        if cache is not None:
+            cache.store(cache_key, found)
+        return path, found, None, _worker_stats()
+    except SystemExit as e:
+        return path, [], str(e), _worker_stats()
+
+
+def _scan_file_to_output(task):
+    '''
+    Helper function for pii_finder_batch. Parses a single file for PII,
+    writing findings to that file's own output file.
+    Inputs:
+        task: (tuple) Valid filename, output filename, output format, and
+            PII types and excluded PII types to scan for
+    Returns: Tuple of path, None, an error message (None if the file was
+        scanned), and scan statistics (None unless collecting statistics)
+    '''
+    path, output_file, output_format, types, exclude_types = task
+    try:
+        pii_finder(path, output_file=output_file, output_format=output_format,
+                   types=types, exclude_types=exclude_types, result_cache=_worker_result_cache)
+        return path, None, None, _worker_stats()
+    except SystemExit as e:
+        return path, None, str(e), _worker_stats()
 
-            # close dict and end JSON file
-            o.write("}}]\n")
-            o.truncate()
+
+def pii_finder_batch(input_dir, pattern='**/*', output_file=None, output_dir=None,
+                     output_format=None, workers=1, progress=True, types=None,
+                     exclude_types=None, stats_callback=None, limits=None,
+                     verify_cache=None, result_cache=None, resolver=None):
+    '''
+    Parse every file in a directory tree matching a glob pattern for potential
+    PII, sharing a single pool of worker processes (and the compiled corpora
+    each worker loads) across all files
+    Inputs:
+        input_dir: (str) Directory to search for files to parse
+        pattern: (str) Glob pattern of files to parse, relative to input_dir.
+            Default is '**/*' (every file in the tree).
+        output_file: (str) NDJSON file to which PII found in all files should
+            be written, with the path of the file each match was found in,
+            or '-' to write to standard output. Default is None.
+        output_dir: (str) Directory in which to write a separate output file
+            for each file parsed, mirroring the input directory tree. Default
+            is None.
+        output_format: (str) Output format, one of WRITERS. Default is None,
+            in which case it is determined by the output file extension, or is
+            'json' for files written to output_dir.
+        workers: (int) Number of worker processes to scan files with. Default
+            is 1, which scans files in the current process.
+        progress: (boolean) Whether to report progress on standard error.
+            Default is True.
+        types: (list) PII types to scan for. Default is None (all types).
+        exclude_types: (list) PII types not to scan for. Default is None.
+        stats_callback: (function) Function called with the dictionary of
+            per detector timings and counters for all files once the scan is
+            complete. Default is None (statistics are not collected).
+        limits: (ScanLimits) Hardened mode limits, as for pii_finder. Default
+            is None.
+        verify_cache: (tuple) Maximum size and eviction policy of the
+            verifier result caches, as for pii_finder. Caches are shared by
+            all files scanned by the same process. Default is None.
+        result_cache: (ResultCache) Persistent cache of findings by file
+            contents, from which the findings of unchanged files are replayed
+            rather than scanned again. Default is None.
+        resolver: (OverlapResolver) Resolver of overlapping matches, as for
+            pii_finder. Default is None.
+    Returns: Dictionary of paths of files that could not be parsed, with the
+        error for each file as values
+    '''
+    if bool(output_file) == bool(output_dir):
+        sys.exit(f"pii_recognition output error: PII must be written to either an output file or an output directory.")
+    if not os.path.isdir(input_dir):
+        sys.exit(f"pii_recognition file error: Directory {input_dir} was not found.")
+
+    corpora = select_corpora(types, exclude_types)
+    paths = iter_input_files(input_dir, pattern)
+
+    if output_dir:
+        output_format = output_format or 'json'
+        if output_format not in WRITERS:
+            sys.exit(f"pii_recognition output error: Unknown output format '{output_format}'.")
+
+        tasks = []
+        for path in paths:
+            output_path = os.path.join(output_dir, os.path.relpath(path, input_dir)
+                                       + FORMAT_EXTENSIONS[output_format])
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            tasks.append((path, output_path, output_format, types, exclude_types))
+        scan_fcn = _scan_file_to_output
+
+    else:
+        if output_file == '-' and not output_format:
+            output_format = 'ndjson'
+        else:
+            output_format = writer_format(output_file, output_format)
+        if output_format != 'ndjson':
+            sys.exit(f"pii_recognition output error: PII found in several files can only be written to a single NDJSON file.")
+        tasks = paths
+        scan_fcn = _scan_file
+
+    collect_stats = stats_callback is not None
+    scan_stats = ScanStats([detector.info_type for detector in compile_corpora(corpora).detectors])
+
+    if workers > 1:
+        results = imap_ordered(scan_fcn, tasks, workers, initializer=_init_worker,
+                               initargs=(corpora, collect_stats, limits, verify_cache,
+                                         result_cache, resolver))
+    else:
+        previous_cache = compile_corpora(corpora).verify_cache
+        _init_worker(corpora, collect_stats, limits, verify_cache, result_cache, resolver)
+        results = map(scan_fcn, tasks)
+
+    errors = {}
+    o = writer = None
+    try:
+        if output_file:
+            o = sys.stdout if output_file == '-' else open(output_file, 'w')
+            writer = WRITERS[output_format](o)
+            writer.open()
+
+        for done, (path, found, error, file_stats) in enumerate(results, 1):
+            if file_stats is not None:
+                scan_stats.merge(file_stats)
+            if error:
+                errors[path] = error
+            elif writer:
+                for row, row_found in found:
+                    writer.write_row(row, row_found, path=path)
+
+            if progress:
+                status = f"error: {error}" if error else "done"
+                print(f"pii_recognition: [{done}/{len(tasks)}] {path} {status}",
+                      file=sys.stderr, flush=True)
+
+    except Exception as e:
+        sys.exit(f"pii_recognition error: An error occurred when writing to output file '{output_file}': {e}")
+
+    finally:
+        if writer:
+            writer.close()
+        if o and o is not sys.stdout:
             o.close()
+        if workers <= 1:
+            _worker_engine.timing = False
+            _worker_engine.set_limits(None)
+            _worker_engine.set_resolver(None)
+            if verify_cache is not None:
+                _worker_engine.set_verify_cache(*previous_cache)
+            _reset_worker()
 
+    if collect_stats:
+        stats_callback(scan_stats.report())
 
-        except Exception as e:
-            sys.exit(f"pii_recognition error: An unexpected error occurred in file write completion: {e}.")
+    return errors
+
+
+def write_stats(stats_file):
+    '''
+    Make a stats_callback for pii_finder that writes scan statistics as JSON
+    Inputs:
+        stats_file: (str) JSON file to which to write statistics, or '-' to
+            write them to standard error
+    Returns: Function taking a dictionary of scan statistics
+    '''
+    def callback(report):
+        if stats_file == '-':
+            print(json.dumps({'stats': report}, indent=2), file=sys.stderr)
+        else:
+            with open(stats_file, 'w') as f:
+                json.dump({'stats': report}, f, indent=2)
+    return callback
 
 
 if __name__ == "__main__":
@@ -261,11 +1360,34 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Collect arguments for PII recognition.")
 
-    parser.add_argument('--output_file', type=str, help="File name with JSON extension to which to write PII found.", required = True)
+    parser.add_argument('--output_file', type=str, help="File name with JSON or NDJSON extension to which to write PII found, or '-' to write to standard output.")
+    parser.add_argument('--output_dir', type=str, help="Directory in which to write one output file per file parsed with --input_dir.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes to scan text with. Default is 1.")
+    parser.add_argument('--types', type=str, help="Comma separated PII types to scan for. Default is all types.")
+    parser.add_argument('--exclude_types', '--exclude-types', type=str, help="Comma separated PII types not to scan for.")
+    parser.add_argument('--stats_file', type=str, help="JSON file to which to write per detector timings and counters, or '-' to write them to standard error.")
+    parser.add_argument('--hardened', action='store_true', help="Guard against slow regex backtracking, with a per line time budget for each detector and windowing of long lines.")
+    parser.add_argument('--budget', type=float, help="Seconds each detector may spend on a line in hardened mode. Default is 1.")
+    parser.add_argument('--max_line_length', type=int, help="Lines longer than this are scanned in overlapping windows in hardened mode. Must be greater than 256, the overlap of windows. Default is 10000.")
+    parser.add_argument('--verify_cache_size', type=int, help="Maximum number of verified values each detector caches, or 0 to disable caching. Default is 4096.")
+    parser.add_argument('--verify_cache_policy', type=str, choices=sorted(CACHE_POLICIES), default='lru', help="Verified value cache eviction policy. Default is 'lru'.")
+    parser.add_argument('--checkpoint_file', type=str, help="Checkpoint file with which to scan --ascii_file incrementally, appending findings in lines added since the last scan to an NDJSON --output_file.")
+    parser.add_argument('--result_cache', type=str, help="SQLite file in which to cache findings by file contents, so that unchanged files are not scanned again.")
+    parser.add_argument('--result_cache_mb', type=float, default=RESULT_CACHE_BYTES / 2 ** 20, help="Maximum size of the result cache in megabytes. Default is 256.")
+    parser.add_argument('--mmap', action='store_true', help="Memory map --ascii_file and scan it as a whole rather than line by line.")
+    parser.add_argument('--output_format', type=str, choices=sorted(WRITERS), help="Output format. Default is determined by the output file extension.")
+    parser.add_argument('--resolve_overlaps', action='store_true', help="Report each span of text in a line as a single PII type, preferring verified, then longer, matches.")
+    parser.add_argument('--priority', type=str, help="Comma separated PII types, highest first, whose matches are preferred over all others when resolving overlaps. Implies --resolve_overlaps.")
+    parser.add_argument('--redact_file', type=str, help="File to which to write a copy of --ascii_file or --ascii_text with the PII found masked, in the same pass as the scan.")
+    parser.add_argument('--input_format', type=str, choices=sorted(RECORD_READERS), help="Scan --ascii_file or --ascii_text as CSV (with a header row) or JSONL records field by field, reporting the column or key of each match.")
+    parser.add_argument('--sample_records', type=int, default=SAMPLE_RECORDS, help="Number of records of --input_format input after which each column is only scanned for the PII types found in it so far, or 0 to scan every column for every type. Default is 1000.")
+    parser.add_argument('--masks', type=str, help="Comma separated TYPE=MASK masks for --redact_file, where MASK is token, token:TEXT, hash (keyed by the PII_HASH_KEY environment variable), hash:KEYFILE or partial:N, and TYPE * sets the mask of every other type. Default is token.")
 
     group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument('--ascii_file', type=str, help="Valid file name from which to parse text for PII.")
+    group.add_argument('--ascii_file', type=str, help="Valid file name from which to parse text for PII, or '-' to read from standard input.")
     group.add_argument('--ascii_text', type=str, help="ASCII text string to parse for PII.")
+    group.add_argument('--input_dir', '--input-dir', type=str, help="Directory of files to parse for PII.")
+    parser.add_argument('--glob', type=str, default='**/*', help="Glob pattern of files to parse in --input_dir. Default is '**/*'.")
 
     try:
         args = parser.parse_args(namespace=a)
@@ -275,9 +1397,62 @@ if __name__ == "__main__":
     except Exception as e:
         sys.exit("pii_recognition error: Please review arguements passed: {}".format(e))
 
+    types = a.types.split(',') if a.types else None
+    exclude_types = a.exclude_types.split(',') if a.exclude_types else None
+    stats_callback = write_stats(a.stats_file) if a.stats_file else None
+
+    limits = None
+    if a.budget is not None and a.budget <= 0:
+        sys.exit(f"pii_recognition error: --budget must be a positive number of seconds.")
+    if a.max_line_length is not None and a.max_line_length <= ScanLimits().overlap:
+        sys.exit(f"pii_recognition error: --max_line_length must be greater than the "
+                 f"{ScanLimits().overlap} characters by which windows overlap.")
+    if a.hardened or a.budget or a.max_line_length:
+        limits = ScanLimits(budget=a.budget or 1.0, max_line_length=a.max_line_length or 10000)
+
+    verify_cache = None
+    if a.verify_cache_size is not None or a.verify_cache_policy != 'lru':
+        verify_cache = (VERIFY_CACHE_SIZE if a.verify_cache_size is None else a.verify_cache_size,
+                        a.verify_cache_policy)
+
+    masks = None
+    if a.masks:
+        try:
+            masks = parse_masks(a.masks)
+        except ValueError as e:
+            sys.exit(f"pii_recognition error: {e}.")
+    redact = dict(redact_file=a.redact_file, masks=masks) if a.redact_file else {}
+    if redact and a.input_dir:
+        sys.exit(f"pii_recognition error: --redact_file can only be used with --ascii_file or --ascii_text.")
+    structured = dict(input_format=a.input_format, sample_records=a.sample_records) if a.input_format else {}
+    if structured and a.input_dir:
+        sys.exit(f"pii_recognition error: --input_format can only be used with --ascii_file or --ascii_text.")
+
+    resolver = None
+    if a.resolve_overlaps or a.priority:
+        resolver = OverlapResolver(a.priority.split(',') if a.priority else None)
+
+    result_cache = None
+    if a.result_cache:
+        result_cache = ResultCache(a.result_cache, max_bytes=int(a.result_cache_mb * 2 ** 20))
+
+    # options shared by every scanning mode
+    options = dict(output_format=a.output_format, workers=a.workers, types=types,
+                   exclude_types=exclude_types, stats_callback=stats_callback,
+                   limits=limits, verify_cache=verify_cache, result_cache=result_cache,
+                   resolver=resolver)
+
     try:
         # dictionary of found PII must be returned if not written to file
-        if a.ascii_file:
+        if a.input_dir:
+            errors = pii_finder_batch(a.input_dir, pattern=a.glob, output_file=a.output_file,
+                                      output_dir=a.output_dir, **options)
+            if errors:
+                sys.exit(f"pii_recognition error: {len(errors)} file(s) could not be parsed.")
+        elif a.ascii_file == '-':
+            pii_finder('<stdin>', output_file=a.output_file, file_format=True, f=sys.stdin,
+                       **redact, **structured, **options)
+        elif a.ascii_file:
             if os.path.exists(a.ascii_file) == 0:
                 sys.exit(f"File '{a.ascii_file}' is invalid.")
             elif os.path.getsize(a.ascii_file) == 0:
@@ -285,12 +1460,15 @@ if __name__ == "__main__":
 
             else:
                 if a.output_file:
-                    pii_finder(a.ascii_file, output_file=a.output_file, file_format=True)
+                    pii_finder(a.ascii_file, output_file=a.output_file, file_format=True,
+                               use_mmap=a.mmap, checkpoint_file=a.checkpoint_file, **redact,
+                               **structured, **options)
                 else:
                     pii_finder(a.ascii_file, file_format=True)
         elif a.ascii_text:
             if a.output_file:
-                pii_finder(a.ascii_text, output_file=a.output_file,  file_format=False)
+                pii_finder(a.ascii_text, output_file=a.output_file,  file_format=False,
+                           **redact, **structured, **options)
             else:
                 pii_finder(a.ascii_text, output_file=None, file_format=False)
 
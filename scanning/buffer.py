@@ -0,0 +1,160 @@
+import re
+from array import array
+from bisect import bisect_left
+
+
+# bytes on which bytes patterns may not behave like the str patterns they are
+# translated from: non-ASCII bytes, and the ASCII separators str patterns
+# treat as whitespace
+_UNSAFE = re.compile(rb"[\x1c-\x1f\x80-\xff]")
+
+_NEWLINE = re.compile(rb"\n")
+
+_LONE_RETURN = re.compile(rb"\r(?!\n)")
+
+
+class LineIndex():
+    '''
+    Index of the end of line characters in a buffer of text, mapping positions
+    in the buffer to row numbers by binary search. Rows are numbered exactly as
+    str.split('\n') would number them, and a carriage return before an end of
+    line character is not part of a row.
+    Inputs:
+        buf: (bytes-like) Buffer of text, e.g. a memory mapped file
+    '''
+    def __init__(self, buf):
+        self.buf = buf
+        self.size = len(buf)
+        self.ends = array('q', (m.start() for m in _NEWLINE.finditer(buf)))
+
+    def __len__(self):
+        return len(self.ends) + 1
+
+    def row(self, position):
+        '''
+        Returns: Row number of the row containing a position in the buffer
+        '''
+        return bisect_left(self.ends, position)
+
+    def start(self, row):
+        '''
+        Returns: Position in the buffer at which a row starts
+        '''
+        return self.ends[row - 1] + 1 if row else 0
+
+    def end(self, row):
+        '''
+        Returns: Position in the buffer at which a row ends, excluding its end
+            of line characters
+        '''
+        end = self.ends[row] if row < len(self.ends) else self.size
+        if end > self.start(row) and self.buf[end - 1] == 13:
+            end -= 1
+        return end
+
+    def has_lone_returns(self):
+        '''
+        Returns: Whether the buffer contains carriage returns that are not
+            followed by an end of line character (which text mode reading
+            treats as ends of lines)
+        '''
+        return _LONE_RETURN.search(self.buf) is not None
+
+    def rows_containing(self, literals, start=0, end=None):
+        '''
+        Find the rows containing any of a number of literal strings
+        Inputs:
+            literals: (tuple) Literal bytes strings to search for
+            start: (int) Position in the buffer from which to search. Default
+                is 0.
+            end: (int) Position in the buffer up to which to search. Default
+                is None (the end of the buffer).
+        Returns: Sorted list of row numbers
+        '''
+        end = self.size if end is None else end
+        rows = set()
+        for literal in literals:
+            position = self.buf.find(literal, start, end)
+            while position != -1:
+                row = self.row(position)
+                rows.add(row)
+                if row >= len(self.ends):
+                    break
+                # skip to the next row, as this one is already found
+                position = self.buf.find(literal, self.ends[row] + 1, end)
+        return sorted(rows)
+
+    def rows_matching(self, pattern, start=0, end=None):
+        '''
+        Find the rows containing a match for a regex pattern
+        Inputs:
+            pattern: (compiled bytes regex) Pattern to search for
+            start: (int) Position in the buffer from which to search. Default
+                is 0.
+            end: (int) Position in the buffer up to which to search. Default
+                is None (the end of the buffer).
+        Returns: List of row numbers, in order
+        '''
+        end = self.size if end is None else end
+        rows = []
+        m = pattern.search(self.buf, start, end)
+        while m is not None:
+            row = self.row(m.start())
+            rows.append(row)
+            if row >= len(self.ends):
+                break
+            # skip to the next row, as this one is already found
+            m = pattern.search(self.buf, self.ends[row] + 1, end)
+        return rows
+
+    def unsafe_rows(self, start=0, end=None):
+        '''
+        Find the rows containing bytes that bytes patterns cannot scan like
+        their str patterns, which must be decoded and scanned as text instead
+        Inputs:
+            start: (int) Position in the buffer from which to search. Default
+                is 0.
+            end: (int) Position in the buffer up to which to search. Default
+                is None (the end of the buffer).
+        Returns: Set of row numbers
+        '''
+        return set(self.rows_matching(_UNSAFE, start, end))
+
+
+def bytes_pattern(pattern):
+    '''
+    Translate a str regex pattern into an equivalent bytes pattern for
+    scanning a whole buffer of ASCII text at once. Whitespace classes and '.'
+    are kept from matching across ends of lines, and '^' matches at the start
+    of every row, so that no match spans two rows and each row is scanned as
+    if it were a separate string.
+    Inputs:
+        pattern: (str) Regex pattern
+    Returns: Compiled bytes regex pattern
+    '''
+    translated = []
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            escape = pattern[i:i + 2]
+            if escape == r'\s':
+                translated.append(r' \t\f\v' if in_class else r'[ \t\f\v]')
+            else:
+                translated.append(escape)
+            i += 2
+            continue
+
+        if in_class:
+            # a ']' straight after '[' or '[^' is a literal
+            if char == ']' and pattern[i - 1] != '[' and pattern[i - 2:i] != '[^':
+                in_class = False
+        elif char == '[':
+            in_class = True
+        elif char == '.':
+            char = r'[^\r\n]'
+        translated.append(char)
+        i += 1
+
+    return re.compile(''.join(translated).encode('utf-8'), re.MULTILINE)
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+
+# sentinel for cache lookups, as None and False are valid cached values
+MISSING = object()
+
+
+class LRUCache():
+    '''
+    Bounded least recently used cache, recording cache hit and miss counts.
+    Safe to share between threads.
+    Inputs:
+        maxsize: (int) Maximum number of entries to keep. A maxsize of 0
+            disables caching. Default is 4096.
+    '''
+    # whether looking up an entry protects it from eviction
+    refresh_on_get = True
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        '''
+        Look up a cached value, marking it as most recently used
+        Returns: Cached value, or default if key is not cached
+        '''
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if self.refresh_on_get:
+                self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        '''
+        Cache a value, evicting the least recently used entry if full
+        '''
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        '''
+        Empty the cache and reset its hit and miss counts
+        '''
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        '''
+        Returns: Dictionary of cache hit and miss counts, and current and
+            maximum cache size
+        '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FIFOCache(LRUCache):
+    '''
+    Bounded first in, first out cache, evicting the oldest entry when full
+    regardless of how recently it was looked up. Cheaper than LRUCache when
+    most lookups are hits.
+    Inputs:
+        maxsize: (int) Maximum number of entries to keep. A maxsize of 0
+            disables caching. Default is 4096.
+    '''
+    refresh_on_get = False
+
+
+# cache classes by eviction policy name
+CACHE_POLICIES = {
+    'lru': LRUCache,
+    'fifo': FIFOCache
+    }
@@ -0,0 +1,132 @@
+import os
+import json
+import locale
+import hashlib
+
+
+# number of bytes at the start of a file, and before its checkpoint offset,
+# hashed to recognize the same file on a later scan
+FINGERPRINT_BYTES = 65536
+
+
+def fingerprint(f, offset, block=FINGERPRINT_BYTES):
+    '''
+    Hash the first block of a file, and the block before an offset in it,
+    without reading the whole scanned prefix of the file
+    Inputs:
+        f: (I/O Object) File object opened in binary mode
+        offset: (int) End of the scanned prefix of the file
+        block: (int) Number of bytes to hash at each end of the prefix.
+            Default is FINGERPRINT_BYTES.
+    Returns: Tuple of hex digests of the first and last blocks of the prefix
+    '''
+    f.seek(0)
+    head = hashlib.sha256(f.read(min(offset, block))).hexdigest()
+    start = max(0, offset - block)
+    f.seek(start)
+    tail = hashlib.sha256(f.read(offset - start)).hexdigest()
+    return head, tail
+
+
+def load_checkpoint(checkpoint_file):
+    '''
+    Read a checkpoint saved by save_checkpoint
+    Returns: Dictionary of checkpoint values, or None if checkpoint_file does
+        not exist
+    '''
+    if not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file) as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    '''
+    Write a checkpoint, replacing any previous checkpoint in a single step so
+    that an interrupted write never leaves a partial checkpoint
+    Inputs:
+        checkpoint_file: (str) File to which to write the checkpoint
+        checkpoint: (dict) Checkpoint values, as returned by make_checkpoint
+    '''
+    temporary = checkpoint_file + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temporary, checkpoint_file)
+
+
+def make_checkpoint(path, f, offset, row):
+    '''
+    Record how much of a file has been scanned
+    Inputs:
+        path: (str) Scanned file name
+        f: (I/O Object) Scanned file, opened in binary mode
+        offset: (int) Byte offset up to which the file has been scanned
+        row: (int) Number of the next row to scan
+    Returns: Dictionary of checkpoint values
+    '''
+    head, tail = fingerprint(f, offset)
+    stat = os.fstat(f.fileno())
+    return {'path': os.path.abspath(path), 'offset': offset, 'row': row,
+            'inode': stat.st_ino, 'head_sha256': head, 'tail_sha256': tail}
+
+
+def resume_position(path, f, checkpoint):
+    '''
+    Check whether a file is the same file a checkpoint was saved for, grown
+    only by appending, so that scanning can resume from the checkpoint
+    Inputs:
+        path: (str) File name
+        f: (I/O Object) File, opened in binary mode
+        checkpoint: (dict) Checkpoint values, or None
+    Returns: Tuple of byte offset and row number from which to resume
+        scanning, and a description of why scanning must start over (None if
+        it can resume)
+    '''
+    if checkpoint is None:
+        return 0, 0, None
+
+    stat = os.fstat(f.fileno())
+    offset = checkpoint['offset']
+    if checkpoint['path'] != os.path.abspath(path):
+        reason = f"checkpoint is for {checkpoint['path']}"
+    elif checkpoint['inode'] != stat.st_ino:
+        reason = "file was replaced (rotated)"
+    elif stat.st_size < offset:
+        reason = "file was truncated"
+    elif fingerprint(f, offset) != (checkpoint['head_sha256'], checkpoint['tail_sha256']):
+        reason = "file was rewritten"
+    else:
+        return offset, checkpoint['row'], None
+
+    return 0, 0, reason
+
+
+class AppendedLines():
+    '''
+    Iterator over the complete lines of a file from a byte offset, keeping
+    track of the offset and row number up to which lines have been read. A
+    final line without an end of line character may still be being written,
+    so is left to be read by a later scan.
+    Inputs:
+        f: (I/O Object) File opened in binary mode
+        offset: (int) Byte offset of the first line to read
+        row: (int) Row number of the first line to read
+        encoding: (str) Text encoding of the file. Default is None (the
+            default encoding for text files).
+    '''
+    def __init__(self, f, offset=0, row=0, encoding=None):
+        self.f = f
+        self.offset = offset
+        self.row = row
+        self.encoding = encoding or locale.getpreferredencoding(False)
+
+    def __iter__(self):
+        self.f.seek(self.offset)
+        for line in self.f:
+            if not line.endswith(b'\n'):
+                return
+            text = line[:-2] if line.endswith(b'\r\n') else line[:-1]
+
+            yield self.row, text.decode(self.encoding)
+            self.offset += len(line)
+            self.row += 1
@@ -0,0 +1,169 @@
+import json
+from array import array
+
+from scanning.findings import Finding
+
+
+class ColumnarFindings():
+    '''
+    Compact store of PII findings as parallel columns: arrays of row numbers,
+    start and end positions, PII type ids and value ids, with each distinct PII
+    type and value stored once. No surrounding text is kept, so memory use
+    stays small for scans with millions of findings; context is sliced from
+    the scanned text only when it is asked for. Findings in structured input
+    also keep a column of column ids (-1 for none), stored only when some
+    finding has a column.
+    '''
+    def __init__(self):
+        self.info_types = []
+        self.values = []
+        self.rows = array('q')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.type_ids = array('I')
+        self.value_ids = array('I')
+        self.columns = []
+        self.column_ids = array('i')
+        self._type_index = {}
+        self._value_index = {}
+        self._column_index = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _intern(self, index, table, item):
+        '''
+        Returns: Id of an item in a table of distinct items, adding it if new
+        '''
+        item_id = index.get(item)
+        if item_id is None:
+            item_id = index[item] = len(table)
+            table.append(item)
+        return item_id
+
+    def append(self, row, info_type, value, start, end, column=None):
+        '''
+        Add a single PII match
+        Inputs:
+            row: (int) Text row number
+            info_type: (str) Type of PII match found
+            value: (str) The (verified) text of the PII match
+            start: (int) Starting character position in the line of the match
+            end: (int) Ending character position in the line of the match
+            column: (str) Column (or key) of structured input in which the
+                match was found. Default is None.
+        '''
+        if column is not None and not self.columns:
+            # findings added before the first with a column had none
+            self.column_ids.extend([-1] * len(self.rows))
+        if self.columns or column is not None:
+            self.column_ids.append(-1 if column is None
+                                   else self._intern(self._column_index, self.columns, column))
+        self.rows.append(row)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.type_ids.append(self._intern(self._type_index, self.info_types, info_type))
+        self.value_ids.append(self._intern(self._value_index, self.values, value))
+
+    def extend(self, findings):
+        '''
+        Add PII matches from an iterable of Finding records, e.g. as returned
+        by find_pii, without keeping their lines
+        '''
+        for finding in findings:
+            self.append(finding.row, finding.info_type, finding.value, finding.start, finding.end)
+
+    def add_row(self, row, found):
+        '''
+        Add the PII matches found in a single row of text
+        Inputs:
+            row: (int) Text row number
+            found: (dict) PII types as keys and lists of either
+                (info_type, value, start, end) hits, or PII match tuples (as
+                returned by format_plaintext), as values, each optionally
+                followed by the column it was found in
+        '''
+        for matches in found.values():
+            for info_type, value, start, end, *column in matches:
+                if isinstance(start, str):
+                    # a PII match tuple, with its position and context
+                    start, end = (int(i) for i in start.split(' - '))
+                self.append(row, info_type, value, start, end, *column)
+
+    def finding(self, i, line=''):
+        '''
+        Returns: The i-th PII match as a Finding record, with line as the text
+            line it was found in (from which its context is sliced)
+        '''
+        return Finding(self.rows[i], self.info_types[self.type_ids[i]],
+                       self.values[self.value_ids[i]], self.starts[i], self.ends[i], line)
+
+    def contexts(self, text_by_row):
+        '''
+        Slice the surrounding text of each PII match from the scanned text,
+        reading it once alongside the findings, which are in row order
+        Inputs:
+            text_by_row: (iterable) (row number, line text) tuples of the
+                scanned text, e.g. as returned by stream_ascii
+        Returns: Generator of the context of each PII match in turn, as
+            reported by format_plaintext
+        '''
+        lines = iter(text_by_row)
+        row, line_text = -1, ''
+        for i in range(len(self)):
+            while row < self.rows[i]:
+                row, line_text = next(lines)
+            yield self.finding(i, line_text).context
+
+    def column(self, i):
+        '''
+        Returns: Column of structured input in which the i-th PII match was
+            found, or None
+        '''
+        if not self.columns or self.column_ids[i] < 0:
+            return None
+        return self.columns[self.column_ids[i]]
+
+    def to_dict(self):
+        '''
+        Returns: Dictionary of columns, with ids into the 'info_types' and
+            'values' (and 'columns', if any) tables, for serialization
+        '''
+        columns = {'info_types': self.info_types, 'values': self.values,
+                   'row': self.rows.tolist(), 'start': self.starts.tolist(),
+                   'end': self.ends.tolist(), 'info_type': self.type_ids.tolist(),
+                   'value': self.value_ids.tolist()}
+        if self.columns:
+            columns['columns'] = self.columns
+            columns['column'] = self.column_ids.tolist()
+        return columns
+
+    @classmethod
+    def from_dict(cls, columns):
+        '''
+        Rebuild findings from a dictionary of columns, as returned by to_dict
+        '''
+        findings = cls()
+        findings.info_types = list(columns['info_types'])
+        findings.values = list(columns['values'])
+        findings.rows = array('q', columns['row'])
+        findings.starts = array('q', columns['start'])
+        findings.ends = array('q', columns['end'])
+        findings.type_ids = array('I', columns['info_type'])
+        findings.value_ids = array('I', columns['value'])
+        findings.columns = list(columns.get('columns', []))
+        findings.column_ids = array('i', columns.get('column', []))
+        findings._type_index = {info_type: i for i, info_type in enumerate(findings.info_types)}
+        findings._value_index = {value: i for i, value in enumerate(findings.values)}
+        findings._column_index = {column: i for i, column in enumerate(findings.columns)}
+        return findings
+
+    @classmethod
+    def load(cls, f):
+        '''
+        Read findings written in the columnar output format
+        Inputs:
+            f: (I/O Object) Readable text file object
+        Returns: ColumnarFindings object
+        '''
+        return cls.from_dict(json.load(f))
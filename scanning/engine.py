@@ -0,0 +1,731 @@
+import re
+import signal
+import threading
+from time import perf_counter
+
+from scanning.buffer import bytes_pattern
+from scanning.cache import CACHE_POLICIES, MISSING
+from scanning.overlap import IntervalIndex
+from scanning.stats import ScanStats
+
+
+# matches any (unicode) digit, as \d does in the corpus patterns
+_DIGIT = re.compile(r"\d")
+
+_ASCII_DIGIT = re.compile(rb"[0-9]")
+
+# default maximum number of verified results cached for each detector
+VERIFY_CACHE_SIZE = 4096
+
+
+def count_digits(line_text):
+    '''
+    Count the digits in a line of text, as matched by the regex digit class
+    '''
+    if line_text.isascii():
+        return sum(map(line_text.count, '0123456789'))
+    return len(_DIGIT.findall(line_text))
+
+
+class Prefilter():
+    '''
+    Cheap test of whether a line of text could possibly contain a match for a
+    detector, run before the detector's regex. Every condition must be
+    necessary for a match, so that skipping a line never loses a match.
+    Inputs:
+        min_digits: (int) Minimum number of digits a match contains. Default
+            is 0.
+        required: (tuple) Literal strings that every match contains. Default
+            is ().
+        keywords: (tuple) Literal strings, at least one of which every match
+            contains. Default is ().
+        min_length: (int) Minimum length of a match. Default is 0.
+        uppercase: (boolean) Whether every match contains an uppercase letter.
+            Default is False.
+    '''
+    __slots__ = ('min_digits', 'required', 'keywords', 'min_length', 'uppercase')
+
+    def __init__(self, min_digits=0, required=(), keywords=(), min_length=0,
+                 uppercase=False):
+        self.min_digits = min_digits
+        self.required = required
+        self.keywords = keywords
+        self.min_length = min_length
+        self.uppercase = uppercase
+
+    def __call__(self, line_text, digits):
+        '''
+        Inputs:
+            line_text: (str) Text line to test
+            digits: (int) Number of digits in line_text
+        Returns: False if line_text cannot contain a match, True otherwise
+        '''
+        if digits < self.min_digits or len(line_text) < self.min_length:
+            return False
+        for literal in self.required:
+            if literal not in line_text:
+                return False
+        if self.keywords and not any(keyword in line_text for keyword in self.keywords):
+            return False
+        # a line with no uppercase letters is all lowercase, or has no letters
+        if self.uppercase and line_text.islower():
+            return False
+        return True
+
+    def literals(self):
+        '''
+        Returns: Tuple of literal strings, at least one of which every match
+            contains, or () if there are none
+        '''
+        return self.keywords or self.required[:1]
+
+
+class BudgetExceeded(Exception):
+    '''
+    Raised when a detector's regex runs over its time budget on a line
+    '''
+
+
+class ScanLimits():
+    '''
+    Limits guarding scans against catastrophic regex backtracking
+    Inputs:
+        budget: (float) Maximum seconds each detector may spend on a line (or
+            a window of a long line). A detector running over its budget is
+            stopped, its matches for that line are dropped, and the overrun
+            is reported. Default is None (no budget).
+        max_line_length: (int) Lines longer than this are scanned in
+            overlapping windows of this many characters. Default is None
+            (lines are scanned whole).
+        overlap: (int) Number of characters by which consecutive windows
+            overlap. Matches longer than this may be missed. Default is 256.
+    '''
+    __slots__ = ('budget', 'max_line_length', 'overlap')
+
+    def __init__(self, budget=None, max_line_length=None, overlap=256):
+        if max_line_length is not None and max_line_length <= overlap:
+            raise ValueError(f"max_line_length ({max_line_length}) must be greater than overlap ({overlap})")
+        self.budget = budget
+        self.max_line_length = max_line_length
+        self.overlap = overlap
+
+
+def iter_windows(line_length, window, overlap):
+    '''
+    Split a line into overlapping windows
+    Inputs:
+        line_length: (int) Length of the line
+        window: (int) Maximum window length
+        overlap: (int) Number of characters consecutive windows share
+    Returns: Generator of (start, end) character positions of each window
+    '''
+    start = 0
+    while True:
+        end = min(start + window, line_length)
+        yield start, end
+        if end >= line_length:
+            return
+        start = end - overlap
+
+
+class Detector():
+    '''
+    A single PII detector: an info type, its compiled regex pattern and
+    (optionally) the verification function its regex matches are passed to,
+    and a function verifying a batch of matches at once
+    '''
+    __slots__ = ('index', 'info_type', 'pattern', 'verify_fcn', 'batch_fcn')
+
+    def __init__(self, index, info_type, pattern, verify_fcn=None, batch_fcn=None):
+        self.index = index
+        self.info_type = info_type
+        self.pattern = pattern
+        self.verify_fcn = verify_fcn
+        self.batch_fcn = batch_fcn
+
+
+class ScanEngine():
+    '''
+    Compiles one or more PII corpora once into reusable pattern objects and
+    scans text lines with them. Detectors sharing an identical regex pattern
+    (e.g. MAC_ADDRESS and MAC_ADDRESS_LOCAL) are merged into a single scan,
+    so each distinct pattern is run over a line exactly once.
+    Inputs:
+        corpora: (list) (corpus, verify) pairs, in the order their detectors
+            should be applied. corpus is a REGEX_ONLY_CORPUS-style dictionary
+            when verify is False, or a VERIFY_CORPUS-style dictionary of
+            (pattern, verification function) tuples when verify is True
+        batch_verifiers: (dict) Verification functions as keys, and functions
+            verifying a list of matches at once as values. Matches for
+            detectors with a batch verifier are verified together once a whole
+            line has been scanned. Default is None.
+        prefilters: (dict) PII types as keys and Prefilter objects as values.
+            A detector's regex is only run on lines that pass its prefilter.
+            Default is None.
+    '''
+    def __init__(self, corpora, batch_verifiers=None, prefilters=None):
+        batch_verifiers = batch_verifiers or {}
+        prefilters = prefilters or {}
+        self.detectors = []
+        compiled = {}
+        shared = {}
+
+        for corpus, verify in corpora:
+            for info_type, entry in corpus.items():
+                pattern, verify_fcn = entry if verify else (entry, None)
+
+                # compile each distinct pattern string only once
+                if pattern not in compiled:
+                    compiled[pattern] = re.compile(pattern)
+                    shared[pattern] = []
+
+                detector = Detector(len(self.detectors), info_type,
+                                    compiled[pattern], verify_fcn,
+                                    batch_verifiers.get(verify_fcn))
+                self.detectors.append(detector)
+                shared[pattern].append(detector)
+
+        # one scan per distinct pattern, feeding every detector that uses it,
+        # and skipped on lines that fail the prefilter of the first of them
+        self.scans = [(compiled[pattern], tuple(detectors),
+                       prefilters.get(detectors[0].info_type))
+                      for pattern, detectors in shared.items()]
+
+        # per detector counters are always kept, while timings are only
+        # recorded when timing is switched on
+        self.stats = ScanStats([detector.info_type for detector in self.detectors])
+        self.timing = False
+
+        # bytes patterns for scanning whole buffers, compiled on first use
+        self._byte_scans = None
+
+        # results of each detector's verification function by match
+        self.verify_caches = None
+        self.set_verify_cache(VERIFY_CACHE_SIZE)
+
+        # scan limits, and the PII types that ran over budget on the last line
+        self.limits = None
+        self.overruns = []
+        self._armed = False
+        self._previous_handler = None
+
+        # resolver of overlapping matches, if matches are resolved, and the
+        # detectors it ranks in groups
+        self.resolver = None
+        self._resolve_groups = None
+
+    def set_resolver(self, resolver):
+        '''
+        Resolve overlapping matches in each line with an OverlapResolver, or
+        report every match if None. While resolving, all verification is
+        deferred until a line has been scanned, so that candidates overlapping
+        the matches of higher ranked detectors are never verified.
+        '''
+        self.resolver = resolver
+        self._resolve_groups = resolver.groups(self.detectors) if resolver is not None else None
+
+    def restrict_scans(self, detector_indexes):
+        '''
+        Select the scans that run only some of the detectors, e.g. to skip
+        detectors that cannot match a column of structured input
+        Inputs:
+            detector_indexes: (set) Indexes of the detectors to run
+        Returns: List of scans, as in self.scans, for scan
+        '''
+        scans = []
+        for pattern, detectors, prefilter in self.scans:
+            kept = tuple(detector for detector in detectors if detector.index in detector_indexes)
+            if kept:
+                scans.append((pattern, kept, prefilter))
+        return scans
+
+    def set_limits(self, limits):
+        '''
+        Guard scans with a ScanLimits object, or remove limits if None. Time
+        budgets use SIGALRM, so are only enforced in the main thread on
+        platforms that support it; elsewhere only windowing is applied.
+        '''
+        budgeted = (limits is not None and limits.budget is not None
+                    and hasattr(signal, 'setitimer')
+                    and threading.current_thread() is threading.main_thread())
+
+        if budgeted and self._previous_handler is None:
+            self._previous_handler = signal.signal(signal.SIGALRM, self._on_alarm)
+        elif not budgeted and self._previous_handler is not None:
+            signal.signal(signal.SIGALRM, self._previous_handler)
+            self._previous_handler = None
+
+        if limits is not None and limits.budget is not None and not budgeted:
+            limits = ScanLimits(None, limits.max_line_length, limits.overlap)
+        self.limits = limits
+
+    def set_verify_cache(self, maxsize=VERIFY_CACHE_SIZE, policy='lru'):
+        '''
+        Cache the results of each detector's verification function, so that
+        a value repeated throughout a scan is only verified once. Each
+        detector has its own cache, emptied whenever this is called. Caches
+        should also be emptied if a verification function's data changes,
+        e.g. after reload_area_codes.
+        Inputs:
+            maxsize: (int) Maximum number of results cached per detector. A
+                maxsize of 0 disables caching. Default is VERIFY_CACHE_SIZE.
+            policy: (str) Eviction policy, one of CACHE_POLICIES ('lru' or
+                'fifo'). Default is 'lru'.
+        '''
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"Unknown cache policy '{policy}', expected one of {', '.join(CACHE_POLICIES)}")
+
+        self.verify_cache = (maxsize, policy)
+        if maxsize > 0:
+            self.verify_caches = [CACHE_POLICIES[policy](maxsize) if detector.verify_fcn else None
+                                  for detector in self.detectors]
+        else:
+            self.verify_caches = None
+
+    def verify_cache_info(self):
+        '''
+        Returns: Dictionary with PII types as keys and dictionaries of
+            verifier result cache hit and miss counts, and current and maximum
+            cache size, as values, for detectors with a verification function
+        '''
+        if not self.verify_caches:
+            return {}
+        return {detector.info_type: cache.info()
+                for detector, cache in zip(self.detectors, self.verify_caches)
+                if cache is not None}
+
+    def _verify(self, detector, found):
+        '''
+        Verify a match with a detector's verification function, or its cached
+        result
+        '''
+        cache = self.verify_caches[detector.index] if self.verify_caches else None
+        if cache is None:
+            return detector.verify_fcn(found)
+
+        verified = cache.get(found)
+        if verified is MISSING:
+            self.stats.cache_misses[detector.index] += 1
+            verified = detector.verify_fcn(found)
+            cache.put(found, verified)
+        else:
+            self.stats.cache_hits[detector.index] += 1
+        return verified
+
+    def _verify_batch(self, detector, matches):
+        '''
+        Verify a list of matches with a detector's batch verification
+        function, only passing it matches without a cached result
+        '''
+        cache = self.verify_caches[detector.index] if self.verify_caches else None
+        if cache is None:
+            return detector.batch_fcn(matches)
+
+        verified_all = [cache.get(found) for found in matches]
+        uncached = list(dict.fromkeys(found for found, verified in zip(matches, verified_all)
+                                      if verified is MISSING))
+        self.stats.cache_hits[detector.index] += len(matches) - len(uncached)
+        self.stats.cache_misses[detector.index] += len(uncached)
+        if not uncached:
+            return verified_all
+
+        newly_verified = dict(zip(uncached, detector.batch_fcn(uncached)))
+        for found, verified in newly_verified.items():
+            cache.put(found, verified)
+        return [newly_verified[found] if verified is MISSING else verified
+                for found, verified in zip(matches, verified_all)]
+
+    def _on_alarm(self, signum, frame):
+        # only interrupt a detector while its budget timer is armed
+        if self._armed:
+            raise BudgetExceeded()
+
+    def scan(self, line_text, scans=None):
+        '''
+        Run every detector over a line of text, within any scan limits
+        Inputs:
+            line_text: (str) Text line to scan for PII
+            scans: (list) Subset of self.scans to run, as returned by
+                restrict_scans. Default is None (every scan).
+        Returns: List, indexed like self.detectors, of lists of
+            (value, start, end) tuples for each verified (or regex only)
+            PII match found by that detector
+        '''
+        results = [[] for _ in self.detectors]
+        batched = {}
+        limits = self.limits
+        self.overruns = []
+        self.stats.lines += 1
+
+        line_length = len(line_text)
+        if limits is None or limits.max_line_length is None or line_length <= limits.max_line_length:
+            self._scan_window(line_text, 0, True, True, results, batched, None, scans=scans)
+        else:
+            # matches seen in more than one window are only kept once
+            seen = set()
+            for start, end in iter_windows(line_length, limits.max_line_length, limits.overlap):
+                self._scan_window(line_text[start:end], start, start == 0,
+                                  end == line_length, results, batched, seen, scans=scans)
+
+            for hits in results:
+                hits.sort(key=lambda hit: (hit[1], hit[2]))
+            for candidates in batched.values():
+                candidates.sort(key=lambda candidate: (candidate[1], candidate[2]))
+
+        return self._finish(results, batched)
+
+    def scan_window(self, text, offset, at_start, at_end, seen, margin=1):
+        '''
+        Run every detector over one of the overlapping windows of a line too
+        long to be held in memory whole, e.g. as read by iter_file_windows.
+        Scan budgets apply to each window.
+        Inputs:
+            text: (str) Window of a line to scan
+            offset: (int) Position of text in the line
+            at_start: (boolean) Whether text starts at the start of the line
+            at_end: (boolean) Whether text ends at the end of the line
+            seen: (set) (detector index, start, end) of matches found in
+                previous windows of the line, updated with those found in
+                this one
+            margin: (int) Matches within this many characters of a window
+                edge that is not an end of the line are ignored, to be found
+                in the neighbouring window instead. Default is 1 (matches
+                touching the edge).
+        Returns: List, indexed like self.detectors, of lists of
+            (value, start, end) tuples, with start and end positions in the
+            line, for PII matches found in this window
+        '''
+        results = [[] for _ in self.detectors]
+        batched = {}
+        self.overruns = []
+        if at_start:
+            self.stats.lines += 1
+
+        self._scan_window(text, offset, at_start, at_end, results, batched, seen, margin)
+        return self._finish(results, batched)
+
+    def _finish(self, results, batched):
+        '''
+        Helper function for scan and scan_window. Verifies matches deferred
+        until a whole line (or window) has been scanned, resolving overlaps
+        if resolving.
+        Returns: List, indexed like self.detectors, of verified matches
+        '''
+        if self.resolver is not None:
+            return self._resolve(results, batched)
+
+        timing, stats = self.timing, self.stats
+        for detector, candidates in batched.items():
+            if timing:
+                verify_start = perf_counter()
+            verified_all = self._verify_batch(detector, [found for found, _, _ in candidates])
+            if timing:
+                stats.verify_seconds[detector.index] += perf_counter() - verify_start
+
+            for verified, (_, start, end) in zip(verified_all, candidates):
+                if verified:
+                    results[detector.index].append((verified, start, end))
+                    stats.verified[detector.index] += 1
+
+        return results
+
+    def _resolve(self, results, batched):
+        '''
+        Helper function for scan. Verifies deferred matches and resolves
+        overlapping matches, one group of equally ranked detectors at a time,
+        skipping candidates overlapping the matches of a higher ranked group.
+        Inputs:
+            results: (list) Matches found by each regex only detector
+            batched: (dict) Matches awaiting verification by detector
+        Returns: List, indexed like self.detectors, of the matches kept
+        '''
+        if not batched and not any(results):
+            return results
+
+        timing, stats = self.timing, self.stats
+        resolved = [[] for _ in self.detectors]
+        claimed = IntervalIndex()
+
+        for group in self._resolve_groups:
+            matches = []
+            for detector in group:
+                if detector.verify_fcn is None:
+                    matches.extend((detector, found, start, end)
+                                   for found, start, end in results[detector.index])
+                    continue
+                if detector not in batched:
+                    continue
+
+                candidates = []
+                for candidate in batched[detector]:
+                    if claimed.overlaps(candidate[1], candidate[2]):
+                        stats.overlapped[detector.index] += 1
+                    else:
+                        candidates.append(candidate)
+                if not candidates:
+                    continue
+
+                if timing:
+                    verify_start = perf_counter()
+                if detector.batch_fcn is not None:
+                    verified_all = self._verify_batch(detector, [found for found, _, _ in candidates])
+                else:
+                    verified_all = [self._verify(detector, found) for found, _, _ in candidates]
+                if timing:
+                    stats.verify_seconds[detector.index] += perf_counter() - verify_start
+
+                for verified, (_, start, end) in zip(verified_all, candidates):
+                    if verified:
+                        matches.append((detector, verified, start, end))
+                        stats.verified[detector.index] += 1
+
+            if not matches:
+                continue
+            for (detector, value, start, end), kept in zip(matches, self.resolver.claim(claimed, matches)):
+                if kept:
+                    resolved[detector.index].append((value, start, end))
+                else:
+                    stats.overlapped[detector.index] += 1
+
+        for hits in resolved:
+            if len(hits) > 1:
+                hits.sort(key=lambda hit: (hit[1], hit[2]))
+        return resolved
+
+    def _scan_window(self, text, offset, at_start, at_end, results, batched, seen, margin=1,
+                     scans=None):
+        '''
+        Helper function for scan. Runs every detector over a line, or a window
+        of a line, adding matches to results (or to batched, for detectors
+        verified in batches).
+        Inputs:
+            text: (str) Line, or window of a line, to scan
+            offset: (int) Position of text in the line
+            at_start: (boolean) Whether text starts at the start of the line.
+                If not, matches at the start of text are ignored, as they may
+                be cut off by the window.
+            at_end: (boolean) Whether text ends at the end of the line. If
+                not, matches at the end of text are ignored.
+            results: (list) Matches found by each detector
+            batched: (dict) Matches awaiting batch verification by detector
+            seen: (set) (detector index, start, end) of matches already found
+                in previous windows, or None if the line is not windowed
+            margin: (int) Distance from a window edge within which matches
+                are ignored. Default is 1 (matches touching the edge).
+            scans: (list) Subset of self.scans to run. Default is None
+                (every scan).
+        '''
+        stats, timing = self.stats, self.timing
+        budget = self.limits.budget if self.limits is not None else None
+        digits = count_digits(text)
+        text_length = len(text)
+
+        for pattern, detectors, prefilter in (self.scans if scans is None else scans):
+            if prefilter is not None and not prefilter(text, digits):
+                for detector in detectors:
+                    stats.skipped[detector.index] += 1
+                continue
+
+            if timing:
+                scan_start, verify_seconds = perf_counter(), 0.0
+            if budget is not None:
+                # matches kept so far, to roll back to if over budget
+                kept = [(len(results[detector.index]), len(batched.get(detector, ())))
+                        for detector in detectors]
+
+            try:
+                if budget is not None:
+                    self._armed = True
+                    signal.setitimer(signal.ITIMER_REAL, budget)
+
+                for m in pattern.finditer(text):
+                    found = m.group(0).strip()
+                    if not found:
+                        continue
+                    if (not at_start and m.start() < margin) or (not at_end and m.end() > text_length - margin):
+                        continue
+                    start, end = m.start() + offset, m.end() + offset
+
+                    for detector in detectors:
+                        if seen is not None:
+                            if (detector.index, start, end) in seen:
+                                continue
+                            seen.add((detector.index, start, end))
+
+                        stats.candidates[detector.index] += 1
+                        if detector.verify_fcn is None:
+                            results[detector.index].append((found, start, end))
+                            stats.verified[detector.index] += 1
+                        elif detector.batch_fcn is not None or self.resolver is not None:
+                            # defer verification until the whole line is scanned
+                            batched.setdefault(detector, []).append((found, start, end))
+                        else:
+                            if timing:
+                                verify_start = perf_counter()
+                                verified = self._verify(detector, found)
+                                elapsed = perf_counter() - verify_start
+                                stats.verify_seconds[detector.index] += elapsed
+                                verify_seconds += elapsed
+                            else:
+                                verified = self._verify(detector, found)
+
+                            if verified:
+                                results[detector.index].append((verified, start, end))
+                                stats.verified[detector.index] += 1
+
+            except BudgetExceeded:
+                for detector, (n_results, n_batched) in zip(detectors, kept):
+                    del results[detector.index][n_results:]
+                    if detector in batched:
+                        del batched[detector][n_batched:]
+                    stats.overruns[detector.index] += 1
+                    self.overruns.append(detector.info_type)
+
+            finally:
+                if budget is not None:
+                    self._armed = False
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+
+            if timing:
+                regex_seconds = perf_counter() - scan_start - verify_seconds
+                for detector in detectors:
+                    stats.regex_seconds[detector.index] += regex_seconds
+
+    def scan_buffer(self, buf, index, first_row=0, last_row=None, skip_rows=()):
+        '''
+        Run every detector over a block of rows of a buffer of ASCII text, e.g.
+        a memory mapped file, without splitting it into lines. Detectors whose
+        prefilter requires digits or literal strings are run only over the
+        rows found to pass it by searching the buffer, and all others over the
+        whole block at once. Matches are assigned to rows by binary search of
+        the buffer's LineIndex. Scan limits do not apply.
+        Inputs:
+            buf: (bytes-like) Buffer of text to scan for PII
+            index: (LineIndex) Index of the rows of buf
+            first_row: (int) First row of the block to scan. Default is 0.
+            last_row: (int) Row after the last row of the block to scan.
+                Default is None (the end of the buffer).
+            skip_rows: (set) Row numbers of rows not to scan, e.g. those
+                containing non-ASCII text. Default is ().
+        Returns: Dictionary with row numbers as keys and lists, indexed like
+            self.detectors, of lists of (value, start, end) tuples for each
+            verified (or regex only) PII match found by that detector in the
+            row as values, for rows in which PII was found
+        '''
+        if self._byte_scans is None:
+            self._byte_scans = [(bytes_pattern(pattern.pattern), detectors, prefilter,
+                                 tuple(literal.encode('ascii') for literal in prefilter.literals())
+                                 if prefilter is not None else ())
+                                for pattern, detectors, prefilter in self.scans]
+
+        last_row = len(index) if last_row is None else last_row
+        block_start, block_end = index.start(first_row), index.end(last_row - 1)
+        lines = last_row - first_row - len(skip_rows)
+
+        found_by_row = {}
+        batched = {}
+        timing, stats = self.timing, self.stats
+        stats.lines += lines
+
+        # text of the rows prefilters are run on, decoded once per block
+        texts = {}
+
+        def line_text(row):
+            if row not in texts:
+                texts[row] = buf[index.start(row):index.end(row)].decode('ascii')
+            return texts[row]
+
+        def row_results(row):
+            if row not in found_by_row:
+                found_by_row[row] = [[] for _ in self.detectors]
+            return found_by_row[row]
+
+        # digits in each row containing any, for digit prefilters
+        digits = {row: count_digits(line_text(row))
+                  for row in index.rows_matching(_ASCII_DIGIT, block_start, block_end)
+                  if row not in skip_rows}
+
+        for pattern, detectors, prefilter, literals in self._byte_scans:
+            if timing:
+                scan_start, verify_seconds = perf_counter(), 0.0
+
+            if literals:
+                rows = index.rows_containing(literals, block_start, block_end)
+            elif prefilter is not None and prefilter.min_digits:
+                rows = sorted(digits)
+            else:
+                rows = None
+
+            if rows is None:
+                matches = pattern.finditer(buf, block_start, block_end)
+            else:
+                rows = [row for row in rows if row not in skip_rows
+                        and prefilter(line_text(row), digits.get(row, 0))]
+                for detector in detectors:
+                    stats.skipped[detector.index] += lines - len(rows)
+                matches = (m for row in rows
+                           for m in pattern.finditer(buf, index.start(row), index.end(row)))
+
+            for m in matches:
+                found = m.group(0).strip()
+                if not found:
+                    continue
+                row = index.row(m.start())
+                if row in skip_rows:
+                    continue
+                found = found.decode('ascii')
+                line_start = index.start(row)
+                start, end = m.start() - line_start, m.end() - line_start
+
+                for detector in detectors:
+                    stats.candidates[detector.index] += 1
+                    if detector.verify_fcn is None:
+                        row_results(row)[detector.index].append((found, start, end))
+                        stats.verified[detector.index] += 1
+                    elif detector.batch_fcn is not None:
+                        # verify all of the block's matches at once
+                        batched.setdefault(detector, []).append((found, row, start, end))
+                    else:
+                        if timing:
+                            verify_start = perf_counter()
+                            verified = self._verify(detector, found)
+                            elapsed = perf_counter() - verify_start
+                            stats.verify_seconds[detector.index] += elapsed
+                            verify_seconds += elapsed
+                        else:
+                            verified = self._verify(detector, found)
+
+                        if verified:
+                            row_results(row)[detector.index].append((verified, start, end))
+                            stats.verified[detector.index] += 1
+
+            if timing:
+                regex_seconds = perf_counter() - scan_start - verify_seconds
+                for detector in detectors:
+                    stats.regex_seconds[detector.index] += regex_seconds
+
+        for detector, candidates in batched.items():
+            if timing:
+                verify_start = perf_counter()
+            verified_all = self._verify_batch(detector, [found for found, _, _, _ in candidates])
+            if timing:
+                stats.verify_seconds[detector.index] += perf_counter() - verify_start
+
+            for verified, (_, row, start, end) in zip(verified_all, candidates):
+                if verified:
+                    row_results(row)[detector.index].append((verified, start, end))
+                    stats.verified[detector.index] += 1
+
+        return found_by_row
+
+    def skip_stats(self):
+        '''
+        Report how often each detector's regex was skipped by its prefilter
+        Returns: Dictionary with PII types as keys and dictionaries of lines
+            scanned, lines skipped and skip rate as values
+        '''
+        lines = self.stats.lines
+        return {detector.info_type: {'lines': lines,
+                                     'skipped': self.stats.skipped[detector.index],
+                                     'skip_rate': self.stats.skipped[detector.index] / lines if lines else 0.0}
+                for detector in self.detectors}
@@ -0,0 +1,46 @@
+from collections import namedtuple
+
+
+class Finding(namedtuple('Finding', ['row', 'info_type', 'value', 'start', 'end', 'line', 'offset'],
+                         defaults=(0,))):
+    '''
+    Lightweight record of a single PII match. Holds a reference to the line
+    the match was found in rather than a copy of its surrounding text, which
+    is only sliced out if context is requested. Lines too long to be held
+    whole are instead represented by the text around the match.
+    Inputs:
+        row: (int) Text row number
+        info_type: (str) Type of PII match found
+        value: (str) The (verified) text of the PII match
+        start: (int) Starting character position in the line of the match
+        end: (int) Ending character position in the line of the match
+        line: (str) Text line in which the match was found, or part of it
+            containing the match and its context
+        offset: (int) Position of line in the whole text line. Default is 0.
+    '''
+    __slots__ = ()
+
+    @property
+    def context(self):
+        '''
+        Returns: Text surrounding the match, as reported by format_plaintext:
+            the whole line for lines of up to 50 characters, otherwise 20
+            characters either side of the match
+        '''
+        line_length = len(self.line)
+        if line_length > 50:
+            start, end = self.start - self.offset, self.end - self.offset
+            return self.line[max(0, start - 20):min(line_length, end + 20)]
+        return self.line
+
+    def as_tuple(self):
+        '''
+        Returns: PII match tuple in the format written to JSON output, as
+            returned by format_plaintext
+        '''
+        return (self.info_type, self.value, f"{self.start} - {self.end}", self.context)
+
+    def __repr__(self):
+        # lines may be very long, so are left out
+        return (f"Finding(row={self.row!r}, info_type={self.info_type!r}, value={self.value!r}, "
+                f"start={self.start!r}, end={self.end!r})")
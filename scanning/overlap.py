@@ -0,0 +1,86 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex():
+    '''
+    Index of the disjoint spans of a line of text claimed by PII matches,
+    kept sorted so that overlaps are found by binary search
+    '''
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        '''
+        Returns: Whether the span from start to end overlaps a claimed span
+        '''
+        # claimed spans are disjoint, so the only one that can overlap is the
+        # last one starting before end
+        i = bisect_left(self.starts, end) - 1
+        return i >= 0 and self.ends[i] > start
+
+    def claim(self, start, end):
+        '''
+        Claim a span that does not overlap any claimed span
+        '''
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+
+class OverlapResolver():
+    '''
+    Resolves overlapping PII matches in a line of text, so that each span of
+    text is reported as a single PII type. Matches are ranked by the priority
+    of their PII type, then matches of verified detectors above those of
+    regex only detectors, then longer matches above shorter ones, then earlier
+    matches above later ones, and each is kept only if it does not overlap a
+    higher ranked match.
+    Inputs:
+        priority: (list) PII types, highest priority first, which rank above
+            all other PII types. Default is None (all PII types rank equally).
+    '''
+    def __init__(self, priority=None):
+        self.priority = list(priority or [])
+        self._ranks = {info_type: rank for rank, info_type in enumerate(self.priority)}
+
+    def __repr__(self):
+        return f"OverlapResolver(priority={self.priority!r})"
+
+    def groups(self, detectors):
+        '''
+        Group detectors by rank, so that each group's matches can be resolved
+        after those of every higher ranked group. A verified detector's
+        candidate matches overlapping a span already claimed by a higher
+        ranked group need not be verified at all.
+        Inputs:
+            detectors: (list) Detector objects of a ScanEngine
+        Returns: List of lists of detectors, highest rank first
+        '''
+        ranked = {}
+        for detector in detectors:
+            rank = (self._ranks.get(detector.info_type, len(self.priority)),
+                    detector.verify_fcn is None)
+            ranked.setdefault(rank, []).append(detector)
+        return [ranked[rank] for rank in sorted(ranked)]
+
+    @staticmethod
+    def claim(claimed, matches):
+        '''
+        Claim the spans of the matches of a single group of detectors, longest
+        first, skipping those overlapping an already claimed span
+        Inputs:
+            claimed: (IntervalIndex) Spans claimed so far in the line
+            matches: (list) (detector, value, start, end) tuples
+        Returns: List of whether each match is kept, in the order of matches
+        '''
+        kept = [False] * len(matches)
+        for i in sorted(range(len(matches)), key=lambda i: (matches[i][2] - matches[i][3], matches[i][2])):
+            _, _, start, end = matches[i]
+            if not claimed.overlaps(start, end):
+                claimed.claim(start, end)
+                kept[i] = True
+        return kept
@@ -0,0 +1,79 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def iter_chunks(text_by_row, chunk_size):
+    '''
+    Group numbered rows of text into line-aligned chunks
+    Inputs:
+        text_by_row: (iterable) (row number, line text) tuples
+        chunk_size: (int) Maximum number of rows per chunk
+    Returns: Generator of lists of (row number, line text) tuples
+    '''
+    chunk = []
+    for row_line in text_by_row:
+        chunk.append(row_line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def imap_ordered(fn, tasks, workers, initializer=None, initargs=()):
+    '''
+    Apply a function to tasks in a pool of worker processes, returning results
+    in task order. At most two tasks per worker are in flight at any time, so
+    tasks are only read from the tasks iterable as workers become free.
+    Inputs:
+        fn: (function) Picklable function of a single task
+        tasks: (iterable) Picklable task arguments
+        workers: (int) Number of worker processes
+        initializer: (function) Function run once in each worker process on
+            start up, e.g. to compile corpora and load models. Default is None.
+        initargs: (tuple) Arguments passed to initializer
+    Returns: Generator of the results of fn, in task order
+    '''
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                               initargs=initargs)
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(pool.submit(fn, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    finally:
+        # don't wait on queued tasks if the caller stops early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def scan_parallel(text_by_row, scan_chunk, workers, chunk_size=1000,
+                  initializer=None, initargs=(), merge_stats=None):
+    '''
+    Scan numbered rows of text in a pool of worker processes. Rows are sent to
+    workers in line-aligned chunks, and results are returned in row order, as
+    they would be by a serial scan.
+    Inputs:
+        text_by_row: (iterable) (row number, line text) tuples
+        scan_chunk: (function) Picklable function taking a list of
+            (row number, line text) tuples and returning a tuple of a list of
+            results and scan statistics for the chunk (or None)
+        workers: (int) Number of worker processes
+        chunk_size: (int) Number of rows per chunk. Default is 1000.
+        initializer: (function) Function run once in each worker process on
+            start up, e.g. to compile corpora and load models. Default is None.
+        initargs: (tuple) Arguments passed to initializer
+        merge_stats: (function) Function called with the scan statistics
+            returned for each chunk, e.g. ScanStats.merge. Default is None.
+    Returns: Generator of the results of scan_chunk, in row order
+    '''
+    chunks = iter_chunks(text_by_row, chunk_size)
+    for results, chunk_stats in imap_ordered(scan_chunk, chunks, workers,
+                                             initializer=initializer, initargs=initargs):
+        if merge_stats is not None and chunk_stats is not None:
+            merge_stats(chunk_stats)
+        yield from results
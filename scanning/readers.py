@@ -0,0 +1,194 @@
+import io
+import os
+import bz2
+import glob
+import gzip
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+# magic bytes starting the compressed files that can be scanned directly
+COMPRESSIONS = {
+    'gzip': (b'\x1f\x8b',),
+    # 'BZh', a block size digit, and the magic of a first block or of the end
+    # of an empty stream
+    'bz2': tuple(b'BZh' + bytes([size]) + magic for size in b'123456789'
+                 for magic in (b'1AY&SY', b'\x17rE8P\x90')),
+    'xz': (b'\xfd7zXZ\x00',)
+    }
+
+_MAGIC_BYTES = 10
+
+# default maximum number of characters of a line read into memory at once
+WINDOW_LENGTH = 1000000
+
+
+def iter_file_lines(f):
+    '''
+    Lazily split a text (or binary) file object into lines, reading through
+    the file object's buffer so that only one line is held in memory at a time
+    Inputs:
+        f: (I/O Object) Readable file object, e.g. an open file or sys.stdin
+    Returns: Generator of (row number, line text) tuples, with rows numbered
+        exactly as str.split('\n') would number them
+    '''
+    if isinstance(f, (io.RawIOBase, io.BufferedIOBase)):
+        f = io.TextIOWrapper(f)
+
+    row, line = 0, None
+    for row, line in enumerate(f):
+        yield row, line[:-1] if line.endswith('\n') else line
+
+    # str.split('\n') yields a final empty row after a trailing end of line
+    # character, or for an empty file
+    if line is None:
+        yield 0, ''
+    elif line.endswith('\n'):
+        yield row + 1, ''
+
+
+def iter_file_windows(f, max_line_length=WINDOW_LENGTH, overlap=256):
+    '''
+    Lazily split a text (or binary) file object into lines as iter_file_lines
+    does, but read lines longer than max_line_length (e.g. minified JSON or
+    XML) in overlapping windows, so that no more than max_line_length
+    characters of a line are held in memory at a time
+    Inputs:
+        f: (I/O Object) Readable file object, e.g. an open file or sys.stdin
+        max_line_length: (int) Maximum number of characters in a window.
+            Default is WINDOW_LENGTH.
+        overlap: (int) Number of characters by which consecutive windows of
+            a line overlap. Default is 256.
+    Returns: Generator of (row number, window text, position of the window
+        in the line, whether the window starts the line, whether it ends the
+        line) tuples. Lines no longer than max_line_length are a single
+        window.
+    '''
+    if isinstance(f, (io.RawIOBase, io.BufferedIOBase)):
+        f = io.TextIOWrapper(f)
+
+    row = 0
+    while True:
+        window = f.readline(max_line_length)
+        offset, at_start = 0, True
+
+        # a full window without an end of line character may be followed by
+        # more of the same line
+        while len(window) == max_line_length and not window.endswith('\n'):
+            more = f.readline(max_line_length - overlap)
+            if more in ('', '\n'):
+                window += more
+                break
+            yield row, window, offset, at_start, False
+            offset += len(window) - overlap
+            window, at_start = window[-overlap:] + more, False
+
+        ended = window.endswith('\n')
+        yield row, window[:-1] if ended else window, offset, at_start, True
+
+        # as str.split('\n'), a trailing end of line character is followed
+        # by a final empty row
+        if not ended:
+            return
+        row += 1
+
+
+def iter_text_windows(text, max_line_length=WINDOW_LENGTH, overlap=256):
+    '''
+    Lazily split a string of text into lines as iter_text_lines does, but
+    split lines longer than max_line_length into overlapping windows, as
+    iter_file_windows does, so that long lines are scanned a window at a time
+    Inputs:
+        text: (str) Text to split by end of line characters
+        max_line_length: (int) Maximum number of characters in a window.
+            Default is WINDOW_LENGTH.
+        overlap: (int) Number of characters by which consecutive windows of
+            a line overlap. Default is 256.
+    Returns: Generator of (row number, window text, position of the window
+        in the line, whether the window starts the line, whether it ends the
+        line) tuples, as iter_file_windows
+    '''
+    for row, line_text in iter_text_lines(text):
+        line_length = len(line_text)
+        start = 0
+        while True:
+            end = min(start + max_line_length, line_length)
+            yield row, line_text[start:end], start, start == 0, end == line_length
+            if end >= line_length:
+                break
+            start = end - overlap
+
+
+def compression(path):
+    '''
+    Detect whether a file is compressed by its magic bytes, whatever its
+    extension
+    Inputs:
+        path: (str) Valid filename
+    Returns: Name of compression format in COMPRESSIONS, or None if the file
+        is not compressed
+    '''
+    with open(path, 'rb') as f:
+        head = f.read(_MAGIC_BYTES)
+
+    for name, magics in COMPRESSIONS.items():
+        if head.startswith(magics):
+            return name
+    return None
+
+
+def open_text(path, newline=None):
+    '''
+    Open a text file for reading, decompressing gzip, bz2 and xz compressed
+    files as they are read, so that they are never decompressed in full
+    Inputs:
+        path: (str) Valid filename
+        newline: (str) End of line handling, as for open, e.g. '' to leave
+            end of line characters untranslated for the csv module. Default
+            is None (universal newlines).
+    Returns: Readable text file object
+    '''
+    compressed = compression(path)
+    if compressed == 'gzip':
+        return gzip.open(path, 'rt', newline=newline)
+    if compressed == 'bz2':
+        return bz2.open(path, 'rt', newline=newline)
+    if compressed == 'xz':
+        if lzma is None:
+            raise OSError("xz compressed files cannot be read, as Python was built without lzma")
+        return lzma.open(path, 'rt', newline=newline)
+    return open(path, 'r', newline=newline)
+
+
+def iter_text_lines(text):
+    '''
+    Lazily split a string of text into lines without building a list of lines
+    Inputs:
+        text: (str) Text to split by end of line characters
+    Returns: Generator of (row number, line text) tuples
+    '''
+    row, start = 0, 0
+    while True:
+        end = text.find('\n', start)
+        if end == -1:
+            yield row, text[start:]
+            return
+
+        yield row, text[start:end]
+        row, start = row + 1, end + 1
+
+
+def iter_input_files(input_dir, pattern='**/*'):
+    '''
+    Find the files in a directory tree matching a glob pattern
+    Inputs:
+        input_dir: (str) Directory to search
+        pattern: (str) Glob pattern relative to input_dir, where '**' matches
+            any number of subdirectories. Default is '**/*' (every file).
+    Returns: Sorted list of matching file paths
+    '''
+    paths = glob.glob(os.path.join(input_dir, pattern), recursive=True)
+    return sorted(path for path in paths if os.path.isfile(path))
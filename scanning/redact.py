@@ -0,0 +1,199 @@
+import os
+import hmac
+import hashlib
+
+
+# mask applied to PII types without a mask of their own
+DEFAULT_MASK = 'token'
+
+# environment variable holding the secret key of 'hash' masks without a key
+# file of their own
+HASH_KEY_VARIABLE = 'PII_HASH_KEY'
+
+
+def parse_masks(spec):
+    '''
+    Parse a comma separated list of masks by PII type, e.g.
+    'SSN=partial:4,EMAIL_ADDRESS=hash:KEYFILE,*=token', where '*' sets the mask for
+    every other PII type
+    Inputs:
+        spec: (str) Comma separated TYPE=MASK pairs
+    Returns: Dictionary of masks by PII type
+    '''
+    masks = {}
+    for pair in spec.split(','):
+        info_type, sep, mask = pair.partition('=')
+        if not sep or not info_type.strip():
+            raise ValueError(f"Masks must be given as TYPE=MASK, not '{pair}'")
+        check_mask(mask.strip())
+        masks[info_type.strip()] = mask.strip()
+    return masks
+
+
+def check_mask(mask):
+    '''
+    Check that a mask is one of 'token', 'token:TEXT', 'hash', 'hash:KEYFILE'
+    or 'partial:N', raising ValueError if not
+    '''
+    kind, _, arg = mask.partition(':')
+    if kind == 'partial' and arg.isdigit():
+        return
+    if kind in ('token', 'hash'):
+        return
+    raise ValueError(f"Unknown mask '{mask}', masks are 'token', 'token:TEXT', 'hash', "
+                     f"'hash:KEYFILE' or 'partial:N'")
+
+
+def load_hash_keys(masks):
+    '''
+    Load the secret keys of the 'hash' masks among masks by PII type: the
+    contents of KEYFILE for 'hash:KEYFILE' masks, and the value of the
+    PII_HASH_KEY environment variable for 'hash' masks. Without a secret key,
+    hashes of values with few possibilities (e.g. SSNs or phone numbers) could
+    be reversed by hashing every possible value.
+    Inputs:
+        masks: (dict) Masks by PII type
+    Returns: Dictionary of keys (bytes) by hash mask
+    Raises: ValueError if a key is missing or empty, and OSError if a key
+        file cannot be read
+    '''
+    keys = {}
+    for mask in set((masks or {}).values()):
+        kind, _, key_file = mask.partition(':')
+        if kind != 'hash':
+            continue
+        if key_file:
+            with open(key_file, 'rb') as f:
+                key = f.read().strip()
+        else:
+            key = os.environ.get(HASH_KEY_VARIABLE, '').encode('utf-8')
+        if not key:
+            raise ValueError(f"The '{mask}' mask needs a secret key, "
+                             + (f"but {key_file} is empty" if key_file
+                                else f"set {HASH_KEY_VARIABLE} or give a key file as 'hash:KEYFILE'"))
+        keys[mask] = key
+    return keys
+
+
+def mask_text(text, info_type, mask, key=None):
+    '''
+    Mask a span of PII text
+    Inputs:
+        text: (str) Text to mask
+        info_type: (str) Type of PII in the text
+        mask: (str) 'token' to replace the text with its PII type, e.g.
+            '[SSN]', 'token:TEXT' to replace it with TEXT, 'hash' (or
+            'hash:KEYFILE') to replace it with its PII type and a keyed hash
+            (HMAC-SHA256) of the text, e.g. '[SSN:1f3a...]', so that equal
+            values stay linkable, or 'partial:N' to reveal only its last N
+            letters and digits
+        key: (bytes) Secret key of a 'hash' mask, as loaded by
+            load_hash_keys. Default is None.
+    Returns: Masked text
+    '''
+    kind, _, arg = mask.partition(':')
+    if kind == 'token':
+        return arg or f"[{info_type}]"
+    if kind == 'hash':
+        if not key:
+            raise ValueError(f"The '{mask}' mask needs a secret key")
+        return f"[{info_type}:{hmac.new(key, text.encode('utf-8'), hashlib.sha256).hexdigest()[:12]}]"
+
+    # partial: mask letters and digits but the last N, keeping separators
+    reveal = int(arg)
+    masked = []
+    for char in reversed(text):
+        if char.isalnum():
+            if reveal > 0:
+                reveal -= 1
+            else:
+                char = '*'
+        masked.append(char)
+    return ''.join(reversed(masked))
+
+
+def merge_spans(spans):
+    '''
+    Resolve overlapping PII spans in a line into disjoint spans covering the
+    same text. Each merged span is masked as the PII type of its longest
+    span (the first found, of equally long spans).
+    Inputs:
+        spans: (list) (start, end, info_type) tuples
+    Returns: List of disjoint (start, end, info_type) tuples, in order
+    '''
+    merged = []
+    for start, end, info_type in sorted(spans, key=lambda span: span[0]):
+        if merged and start < merged[-1][1]:
+            last_start, last_end, last_type, longest = merged[-1]
+            if end - start > longest:
+                last_type, longest = info_type, end - start
+            merged[-1] = (last_start, max(last_end, end), last_type, longest)
+        else:
+            merged.append((start, end, info_type, end - start))
+    return [(start, end, info_type) for start, end, info_type, _ in merged]
+
+
+class Redactor():
+    '''
+    Writes a redacted copy of scanned text line by line, as it is scanned,
+    replacing the PII found in each line with a mask for its PII type
+    Inputs:
+        f: (I/O Object) Writable text file object
+        masks: (dict) Masks by PII type (see mask_text), with '*' for the
+            mask of every other PII type. Default is None (DEFAULT_MASK for
+            every PII type).
+        hash_keys: (dict) Secret keys of hash masks, as returned by
+            load_hash_keys. Default is None, in which case they are loaded.
+    '''
+    def __init__(self, f, masks=None, hash_keys=None):
+        self.f = f
+        self.masks = masks or {}
+        self.default_mask = self.masks.get('*', DEFAULT_MASK)
+        self.hash_keys = load_hash_keys(self.masks) if hash_keys is None else hash_keys
+        self.lines_written = 0
+        self.spans_masked = 0
+
+    def redact_line(self, line_text, found):
+        '''
+        Mask the PII found in a line of text
+        Inputs:
+            line_text: (str) Text line
+            found: (dict) PII types as keys and lists of PII match tuples
+                (as returned by format_plaintext) as values
+        Returns: Redacted line text
+        '''
+        spans = []
+        for matches in found.values():
+            for info_type, _, position, _ in matches:
+                start, end = (int(i) for i in position.split(' - '))
+                # match positions include whitespace captured around the PII,
+                # which is left unmasked
+                span = line_text[start:end]
+                start += len(span) - len(span.lstrip())
+                end -= len(span) - len(span.rstrip())
+                if start < end:
+                    spans.append((start, end, info_type))
+
+        redacted, last = [], 0
+        for start, end, info_type in merge_spans(spans):
+            mask = self.masks.get(info_type, self.default_mask)
+            redacted.append(line_text[last:start])
+            redacted.append(mask_text(line_text[start:end], info_type, mask,
+                                      self.hash_keys.get(mask)))
+            last = end
+            self.spans_masked += 1
+        redacted.append(line_text[last:])
+        return ''.join(redacted)
+
+    def write_line(self, line_text, found=None):
+        '''
+        Write a line of text, redacting any PII found in it
+        Inputs:
+            line_text: (str) Text line, without its end of line character
+            found: (dict) PII found in the line, as for redact_line. Default
+                is None (no PII found).
+        '''
+        if self.lines_written:
+            self.f.write('\n')
+        self.f.write(self.redact_line(line_text, found) if found else line_text)
+        self.lines_written += 1
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import inspect
+
+
+# bump when the format of cached results changes, to invalidate every cached
+# result (changes to the source of verification functions, and to the data
+# files they read, are already part of each fingerprint)
+CACHE_VERSION = 1
+
+# default maximum total size of cached findings, in bytes
+RESULT_CACHE_BYTES = 256 * 1024 * 1024
+
+_HASH_CHUNK = 1024 * 1024
+
+# hashes of source and data files by (path, modification time, size)
+_file_hashes = {}
+
+
+def corpus_fingerprint(engine, data_files=()):
+    '''
+    Fingerprint the detectors of a ScanEngine, so that results cached for one
+    set of detectors are never replayed for another (e.g. after a change to
+    REGEX_ONLY_CORPUS or VERIFY_CORPUS, to a verification function or a data
+    file it reads, a different selection of PII types, or resolving
+    overlapping matches)
+    Inputs:
+        engine: (ScanEngine) Compiled PII corpora
+        data_files: (iterable) Files read by verification functions, e.g.
+            area_codes.json. Default is ().
+    Returns: Hex digest string
+    '''
+    detectors = [(detector.info_type, detector.pattern.pattern,
+                  detector.verify_fcn.__qualname__ if detector.verify_fcn else None)
+                 for detector in engine.detectors]
+
+    # source files defining the verification functions
+    sources = set()
+    for detector in engine.detectors:
+        for fcn in (detector.verify_fcn, detector.batch_fcn):
+            source = inspect.getsourcefile(fcn) if fcn is not None else None
+            if source is not None:
+                sources.add(source)
+
+    key = [CACHE_VERSION, detectors,
+           [(os.path.basename(path), _cached_file_hash(path)) for path in sorted(sources)],
+           [(os.path.basename(path), _cached_file_hash(path)) for path in data_files]]
+    if engine.resolver is not None:
+        key.append(engine.resolver.priority)
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+def _cached_file_hash(path):
+    '''
+    Helper function for corpus_fingerprint. Hashes a file only if it has
+    changed since it was last hashed.
+    Returns: SHA-256 hex digest of the contents of a file, or None if it does
+        not exist
+    '''
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        _file_hashes[key] = file_hash(path)
+    return _file_hashes[key]
+
+
+def file_hash(path):
+    '''
+    Returns: SHA-256 hex digest of the contents of a file
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache():
+    '''
+    Persistent cache of the PII found in files, stored in a local SQLite
+    database. Findings are keyed by the hash of a file's contents and the
+    fingerprint of the detectors that found them, so a copy of a file is
+    also a cache hit, and any change to the file or the detectors is a miss.
+    Files whose size and modification time are unchanged since they were
+    last hashed are not hashed again. Once the cached findings exceed
+    max_bytes, the least recently used are evicted.
+    Objects can be passed to worker processes, each of which opens its own
+    connection to the database.
+    Inputs:
+        path: (str) SQLite database file, created if it does not exist
+        max_bytes: (int) Maximum total size of cached (compressed) findings.
+            Default is RESULT_CACHE_BYTES.
+    '''
+    def __init__(self, path, max_bytes=RESULT_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _connect(self):
+        '''
+        Open the database, creating its tables if needed
+        '''
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=60)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS files ("
+                             "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                             "content_hash TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                             "content_hash TEXT, fingerprint TEXT, findings BLOB, "
+                             "bytes INTEGER, last_used REAL, "
+                             "PRIMARY KEY (content_hash, fingerprint))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            self._db.commit()
+        return self._db
+
+    def content_hash(self, path, stat):
+        '''
+        Hash the contents of a file, reusing its last hash if its size and
+        modification time are unchanged
+        Inputs:
+            path: (str) Valid filename
+            stat: (os.stat_result) Result of os.stat for path
+        Returns: SHA-256 hex digest of the file's contents
+        '''
+        db = self._connect()
+        path = os.path.abspath(path)
+        known = db.execute("SELECT content_hash FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                           (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if known:
+            return known[0]
+
+        content_hash = file_hash(path)
+        with db:
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                       (path, stat.st_size, stat.st_mtime_ns, content_hash))
+        return content_hash
+
+    def lookup(self, path, fingerprint):
+        '''
+        Look up the findings cached for a file
+        Inputs:
+            path: (str) Valid filename
+            fingerprint: (str) Fingerprint of the detectors scanning the
+                file, as returned by corpus_fingerprint
+        Returns: Tuple of a key with which to store the file's findings once
+            scanned, and the list of cached (row number, dictionary of PII
+            found) tuples (None if not cached)
+        '''
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns, self.content_hash(path, stat), fingerprint)
+
+        db = self._connect()
+        cached = db.execute("SELECT findings FROM results WHERE content_hash = ? AND fingerprint = ?",
+                            key[3:]).fetchone()
+        if cached is None:
+            self.misses += 1
+            return key, None
+
+        self.hits += 1
+        with db:
+            db.execute("UPDATE results SET last_used = ? WHERE content_hash = ? AND fingerprint = ?",
+                       (time.time(), *key[3:]))
+        return key, [tuple(found) for found in json.loads(zlib.decompress(cached[0]))]
+
+    def store(self, key, found_by_row):
+        '''
+        Cache the findings of a scan of a file, unless the file has changed
+        since it was looked up (e.g. while it was being scanned)
+        Inputs:
+            key: (tuple) Key returned by lookup
+            found_by_row: (list) (row number, dictionary of PII found) tuples
+        '''
+        path, size, mtime_ns, content_hash, fingerprint = key
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            return
+
+        findings = zlib.compress(json.dumps(found_by_row).encode('utf-8'))
+        if len(findings) > self.max_bytes:
+            return
+
+        db = self._connect()
+        with db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                       (content_hash, fingerprint, findings, len(findings), time.time()))
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove the least recently used findings until the cache is no larger
+        than max_bytes
+        '''
+        db = self._connect()
+        with db:
+            total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+            oldest = db.execute("SELECT content_hash, fingerprint, bytes FROM results "
+                                "ORDER BY last_used")
+            evicted = []
+            for content_hash, fingerprint, size in oldest:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((content_hash, fingerprint))
+                total -= size
+            db.executemany("DELETE FROM results WHERE content_hash = ? AND fingerprint = ?", evicted)
+
+    def info(self):
+        '''
+        Returns: Dictionary of cache hit and miss counts in this process, and
+            the number and total size of cached results
+        '''
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries,
+                'bytes': size, 'max_bytes': self.max_bytes}
+
+    def close(self):
+        '''
+        Close the connection to the database
+        '''
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,75 @@
+class ScanStats():
+    '''
+    Per detector counters and timings for PII scans: time spent in each
+    detector's regex and verification function, regex match candidates,
+    verified matches, lines on which the detector was skipped by its
+    prefilter, lines on which it ran over its time budget, verifier result
+    cache hits and misses, and matches (or candidates) dropped for
+    overlapping a higher ranked match when resolving overlaps. Statistics
+    from several scans (e.g. from worker processes) can be combined with
+    merge.
+    Inputs:
+        info_types: (list) PII type of each detector, indexed as the
+            detectors of a ScanEngine
+    '''
+    FIELDS = ('regex_seconds', 'verify_seconds', 'candidates', 'verified', 'skipped',
+              'overruns', 'cache_hits', 'cache_misses', 'overlapped')
+
+    def __init__(self, info_types):
+        self.info_types = list(info_types)
+        self.reset()
+
+    def reset(self):
+        '''
+        Set all counters and timings to zero
+        '''
+        self.lines = 0
+        for field in self.FIELDS:
+            setattr(self, field, [0] * len(self.info_types))
+
+    def merge(self, other):
+        '''
+        Add the counters and timings of another ScanStats object for the same
+        detectors to this one
+        '''
+        self.lines += other.lines
+        for field in self.FIELDS:
+            setattr(self, field, [a + b for a, b in zip(getattr(self, field),
+                                                        getattr(other, field))])
+
+    def take(self):
+        '''
+        Returns: A copy of the current statistics, resetting them to zero
+        '''
+        taken = ScanStats(self.info_types)
+        taken.merge(self)
+        self.reset()
+        return taken
+
+    def report(self):
+        '''
+        Summarize statistics by PII type. Detectors for the same PII type in
+        several corpora are combined. Detectors sharing a regex pattern each
+        report the full time spent running that pattern.
+        Returns: Dictionary with the number of lines scanned, and a
+            dictionary of statistics for each PII type
+        '''
+        by_type = {}
+        detector_counts = {}
+        for i, info_type in enumerate(self.info_types):
+            totals = by_type.setdefault(info_type, dict.fromkeys(self.FIELDS, 0))
+            detector_counts[info_type] = detector_counts.get(info_type, 0) + 1
+            for field in self.FIELDS:
+                totals[field] += getattr(self, field)[i]
+
+        for info_type, totals in by_type.items():
+            lines = self.lines * detector_counts[info_type]
+            totals['regex_seconds'] = round(totals['regex_seconds'], 6)
+            totals['verify_seconds'] = round(totals['verify_seconds'], 6)
+            totals['rejection_rate'] = (1 - totals['verified'] / totals['candidates']
+                                        if totals['candidates'] else 0.0)
+            totals['skip_rate'] = totals['skipped'] / lines if lines else 0.0
+            lookups = totals['cache_hits'] + totals['cache_misses']
+            totals['cache_hit_rate'] = totals['cache_hits'] / lookups if lookups else 0.0
+
+        return {'lines': self.lines, 'detectors': by_type}
@@ -0,0 +1,146 @@
+import csv
+import json
+
+
+# default number of records sampled to learn which detectors can match each
+# column of structured input
+SAMPLE_RECORDS = 1000
+
+
+def iter_csv_records(f):
+    '''
+    Lazily parse a CSV file object into records, naming each field by the
+    column names in the file's header row
+    Inputs:
+        f: (I/O Object) Readable text file object
+    Returns: Generator of (row number, list of (column, value) tuples)
+        tuples, with each record numbered by the row of the file it starts on
+    '''
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    row = reader.line_num
+    for values in reader:
+        # fields beyond the header are named by their position
+        yield row, [(header[i] if i < len(header) else str(i), value)
+                    for i, value in enumerate(values)]
+        row = reader.line_num
+
+
+def flatten_json(value, key=''):
+    '''
+    Flatten a parsed JSON value into (key, text) pairs, naming the values
+    nested in objects and lists by their dotted path, e.g. 'user.emails.0'
+    Inputs:
+        value: Parsed JSON value
+        key: (str) Path of value. Default is '' (the top level value).
+    Returns: Generator of (key, text) tuples for every string, number and
+        boolean in value
+    '''
+    if isinstance(value, dict):
+        for name, item in value.items():
+            yield from flatten_json(item, f"{key}.{name}" if key else str(name))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from flatten_json(item, f"{key}.{i}" if key else str(i))
+    elif isinstance(value, str):
+        yield key, value
+    elif value is not None:
+        yield key, json.dumps(value)
+
+
+def iter_jsonl_records(f):
+    '''
+    Lazily parse a JSONL (newline delimited JSON) file object into records,
+    naming each field by its key, with nested keys flattened
+    Inputs:
+        f: (I/O Object) Readable text file object
+    Returns: Generator of (row number, list of (key, value) tuples) tuples,
+        skipping blank rows
+    '''
+    for row, line in enumerate(f):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Row {row} is not valid JSON: {e}")
+        yield row, list(flatten_json(record))
+
+
+# readers of each structured input format
+RECORD_READERS = {
+    'csv': iter_csv_records,
+    'jsonl': iter_jsonl_records
+    }
+
+
+class ColumnPruner():
+    '''
+    Learns which detectors can match the values of each column (or key) of
+    structured input from a sample of its first records, so that detectors
+    that found nothing in a column's sample are skipped in that column for the
+    rest of the input. Columns first seen after the sample are scanned with
+    every detector.
+    Inputs:
+        engine: (ScanEngine) Compiled PII corpora
+        sample_records: (int) Number of records to sample before pruning. A
+            sample_records of 0 disables pruning. Default is SAMPLE_RECORDS.
+    '''
+    def __init__(self, engine, sample_records=SAMPLE_RECORDS):
+        self.engine = engine
+        self.sample_records = sample_records
+        self.records = 0
+        self._matched = {}
+        self._pruned = {}
+
+    def scans_for(self, column):
+        '''
+        Choose the scans to run on a value of a column, counting each pruned
+        detector as skipped
+        Inputs:
+            column: (str) Column name or key
+        Returns: List of scans for engine.scan, or None to run every scan
+        '''
+        if not self.sample_records or self.records < self.sample_records:
+            return None
+        if column not in self._matched:
+            return None
+
+        if column not in self._pruned:
+            matched = self._matched[column]
+            self._pruned[column] = (self.engine.restrict_scans(matched),
+                                    [detector.index for detector in self.engine.detectors
+                                     if detector.index not in matched])
+        scans, pruned = self._pruned[column]
+        for index in pruned:
+            self.engine.stats.skipped[index] += 1
+        return scans
+
+    def observe(self, column, results):
+        '''
+        Record the detectors that matched a value of a column while sampling
+        Inputs:
+            column: (str) Column name or key
+            results: (list) Matches found by each detector, as returned by
+                engine.scan
+        '''
+        if self.records < self.sample_records:
+            matched = self._matched.setdefault(column, set())
+            matched.update(index for index, hits in enumerate(results) if hits)
+
+    def end_record(self):
+        '''
+        Count a record as scanned
+        '''
+        self.records += 1
+
+    def report(self):
+        '''
+        Returns: Dictionary with columns as keys and the PII types still
+            scanned for in each column as values, once sampling is complete
+        '''
+        return {column: sorted({self.engine.detectors[index].info_type for index in matched})
+                for column, matched in self._matched.items()}
@@ -0,0 +1,202 @@
+import os
+import json
+
+from scanning.columnar import ColumnarFindings
+
+
+class FindingWriter():
+    '''
+    Base class for streaming PII output writers. Findings are written one row
+    at a time, buffered, and flushed to the output file object in batches, so
+    output can go to any writable sink (files, pipes, stdout, sockets) and
+    readers can consume results while a scan is still running.
+    Inputs:
+        f: (I/O Object) Writable text file object
+        batch_size: (int) Number of rows of findings to buffer before
+            flushing to f. Default is 100.
+    '''
+    # whether findings can be appended to output written by an earlier scan
+    appendable = False
+
+    # whether rows must be written as PII match tuples with the surrounding
+    # text of each match (as returned by format_plaintext), rather than as
+    # (info_type, value, start, end) hits
+    context = True
+
+    def __init__(self, f, batch_size=100):
+        self.f = f
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._buffer = []
+        self._pending = 0
+        self._closed = False
+
+    def write_row(self, row, found, path=None):
+        '''
+        Buffer the findings for a single row of text, flushing if a full batch
+        of rows has been buffered
+        Inputs:
+            row: (int) Text row number
+            found: (dict) PII types as keys and lists of PII match tuples
+                (as returned by format_plaintext) as values
+            path: (str) Path of the file the row was read from, when writing
+                findings for several files to one output. Default is None.
+        '''
+        self._buffer.append(self.format_row(row, found, path))
+        self.rows_written += 1
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def format_row(self, row, found, path=None):
+        '''
+        Format the findings for a single row of text as a string of output
+        '''
+        raise NotImplementedError
+
+    def header(self):
+        return ''
+
+    def footer(self):
+        return ''
+
+    def open(self):
+        '''
+        Write any output required before the first row of findings
+        '''
+        self.f.write(self.header())
+
+    def flush(self):
+        '''
+        Write all buffered rows to the output file object
+        '''
+        if self._buffer:
+            self.f.write(''.join(self._buffer))
+            self._buffer = []
+        self._pending = 0
+        self.f.flush()
+
+    def close(self):
+        '''
+        Flush buffered rows and complete the output, so it is valid even if a
+        scan ends early. Safe to call more than once.
+        '''
+        if not self._closed:
+            self._closed = True
+            self._buffer.append(self.footer())
+            self.flush()
+
+
+class JSONWriter(FindingWriter):
+    '''
+    Writes findings as a single JSON list containing a dictionary of row
+    numbers to findings, e.g. [{"0": {"SSN": [...]}, "3": {...}}]
+    The output is only valid JSON once the writer is closed. Findings for
+    several files cannot be combined in this format.
+    '''
+    def header(self):
+        return '[{'
+
+    def format_row(self, row, found, path=None):
+        if path is not None:
+            raise ValueError("JSON output cannot combine findings for several files, use NDJSON output")
+        separator = ',\n' if self.rows_written else ''
+        return f'{separator}"{str(row)}":{json.dumps(found)}'
+
+    def footer(self):
+        return '}]\n'
+
+
+class NDJSONWriter(FindingWriter):
+    '''
+    Writes findings as newline delimited JSON, with one record per PII match
+    found, e.g. {"row": 0, "info_type": "SSN", "match": "310-74-3223",
+    "position": "39 - 50", "context": "...an SSN of 310-74-3223"}
+    Every flushed line is a complete record, so the output stays valid even if
+    a scan is interrupted. Records for several files written to one output
+    also include the "path" of the file each was found in, and records for
+    structured input the "column" (or key) each was found in.
+    '''
+    appendable = True
+
+    def format_row(self, row, found, path=None):
+        keys = {'path': path} if path is not None else {}
+        records = []
+        for matches in found.values():
+            for info_type, match, position, context, *column in matches:
+                record = {**keys, 'row': row, 'info_type': info_type, 'match': match,
+                          'position': position, 'context': context}
+                if column:
+                    record['column'] = column[0]
+                records.append(json.dumps(record))
+                records.append('\n')
+        return ''.join(records)
+
+
+class ColumnarWriter(FindingWriter):
+    '''
+    Writes findings as a single JSON document of parallel columns (see
+    ColumnarFindings), with no surrounding text, e.g. {"info_types": ["SSN"],
+    "values": ["310-74-3223"], "row": [0], "start": [39], "end": [50],
+    "info_type": [0], "value": [0]}. Findings are held in compact columns
+    until the writer is closed, and each distinct PII type and value is only
+    written once. Rows may be written as (info_type, value, start, end) hits,
+    so that no surrounding text is sliced for them at all.
+    Inputs:
+        f: (I/O Object) Writable text file object
+    '''
+    context = False
+
+    def __init__(self, f):
+        super().__init__(f)
+        self.findings = ColumnarFindings()
+
+    def write_row(self, row, found, path=None):
+        if path is not None:
+            raise ValueError("Columnar output cannot combine findings for several files, use NDJSON output")
+        self.findings.add_row(row, found)
+        self.rows_written += 1
+
+    def footer(self):
+        return json.dumps(self.findings.to_dict()) + '\n'
+
+
+# output formats by name, and the output file extensions that select them
+WRITERS = {
+    'json': JSONWriter,
+    'ndjson': NDJSONWriter,
+    'columnar': ColumnarWriter
+    }
+
+# extensions given to output files written in each format
+FORMAT_EXTENSIONS = {
+    'json': '.json',
+    'ndjson': '.ndjson',
+    'columnar': '.columnar'
+    }
+
+WRITER_EXTENSIONS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.columnar': 'columnar'
+    }
+
+
+def writer_format(output_file, output_format=None):
+    '''
+    Determine the output format to write to a given output file
+    Inputs:
+        output_file: (str) Output file name, or '-' for standard output
+        output_format: (str) Name of an output format in WRITERS. Default is
+            None, in which case the format is determined from the output file
+            extension ('json' for standard output).
+    Returns: Name of output format, or None if it cannot be determined
+    '''
+    if output_format:
+        return output_format if output_format in WRITERS else None
+    if output_file == '-':
+        return 'json'
+
+    _, ext = os.path.splitext(output_file)
+    return WRITER_EXTENSIONS.get(ext)
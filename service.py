@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+import concurrent.futures
+
+import finder
+from checkers.check_functions import extract_names_batch
+from scanning.readers import iter_text_windows
+
+
+# largest request body accepted, in bytes
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# warning from warming up this worker process (or the service's scanning
+# thread), if any
+_warm_up_warning = None
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                405: 'Method Not Allowed', 413: 'Payload Too Large',
+                500: 'Internal Server Error'}
+
+
+def warm_up():
+    '''
+    Compile the PII corpora and load NLTK's tokenizer and tagger models, so
+    that the first scan request does not pay for them
+    Returns: Description of any model that could not be loaded, or None
+    '''
+    finder.compile_corpora(finder.CORPORA)
+    try:
+        extract_names_batch(["Service Warm Up"])
+    except Exception as e:
+        return f"NAME verification models could not be loaded: {e}"
+    return None
+
+
+def _warm_up_worker():
+    '''
+    Initializer of the service's worker pool. Warms up each worker as it
+    starts, recording any warning for warm_up_warning.
+    '''
+    global _warm_up_warning
+    _warm_up_warning = warm_up()
+
+
+def warm_up_warning():
+    '''
+    Returns: Warning from warming up the worker this runs in, or None
+    '''
+    return _warm_up_warning
+
+
+def finding_records(found_by_row):
+    '''
+    Flatten the findings of a scan into one record per PII match, with the
+    same fields as NDJSON output
+    Inputs:
+        found_by_row: (iterable) (row number, dictionary of PII found) tuples
+    Returns: List of dictionaries
+    '''
+    return [{'row': row, 'info_type': info_type, 'match': match, 'position': position,
+             'context': context}
+            for row, found in found_by_row
+            for matches in found.values()
+            for info_type, match, position, context in matches]
+
+
+def scan_request(request):
+    '''
+    Scan the text or file of a single scan request for PII
+    Inputs:
+        request: (dict) Request with either 'text' (a string to scan) or
+            'path' (a file to scan), and optionally 'types' and
+            'exclude_types' (lists of PII types)
+    Returns: Tuple of HTTP status code and response dictionary
+    '''
+    if not isinstance(request, dict) or ('text' in request) == ('path' in request):
+        return 400, {'error': "Request must have exactly one of 'text' or 'path'."}
+    for key in ('types', 'exclude_types'):
+        value = request.get(key)
+        if value is not None and (not isinstance(value, list)
+                                  or not all(isinstance(info_type, str) for info_type in value)):
+            return 400, {'error': f"'{key}' must be a list of PII types."}
+
+    for key in ('text', 'path'):
+        if key in request and not isinstance(request[key], str):
+            return 400, {'error': f"'{key}' must be a string."}
+    try:
+        corpora = finder.select_corpora(request.get('types'), request.get('exclude_types'))
+    except SystemExit as e:
+        # finder exits with a message for an invalid selection of PII types
+        return 400, {'error': str(e)}
+
+    try:
+        engine = finder.compile_corpora(corpora)
+        if 'text' in request:
+            windows = iter_text_windows(request['text'], *finder.scan_window(engine))
+        else:
+            if not os.path.isfile(request['path']):
+                return 404, {'error': f"File {request['path']} was not found."}
+            windows = finder.stream_ascii(request['path'], window=finder.scan_window(engine))
+        # long lines are scanned in bounded windows, as by pii_finder
+        return 200, {'findings': finding_records(finder.scan_windows(windows, engine))}
+
+    except SystemExit as e:
+        # finder reports errors during scanning (e.g. in verifiers or loading
+        # models) by exiting with a message
+        return 500, {'error': str(e)}
+
+
+def scan_batch(requests):
+    '''
+    Scan a batch of requests in a worker, one after another, so that an error
+    scanning one request fails only that request
+    Returns: List of (status, response) tuples, as returned by scan_request
+    '''
+    results = []
+    for request in requests:
+        try:
+            results.append(scan_request(request))
+        except Exception as e:
+            results.append((500, {'error': f"An error occurred during PII scanning: {e}"}))
+    return results
+
+
+class ScanService():
+    '''
+    Long lived PII scanning service answering HTTP requests on a Unix socket
+    or a local TCP port. Corpora and NLTK models are loaded once when the
+    service starts. Requests arriving together are collected into batches,
+    and each batch is scanned by a pool of workers.
+    Inputs:
+        workers: (int) Number of worker processes. Default is 1, which scans
+            in a single thread of the service process.
+        batch_window: (float) Seconds to wait for more requests to join a
+            batch after the first arrives. Default is 0.002.
+        max_batch: (int) Maximum number of requests in a batch. Default is 32.
+    '''
+    def __init__(self, workers=1, batch_window=0.002, max_batch=32):
+        self.workers = workers
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.requests_served = 0
+        self._queue = None
+        self._pool = None
+        self._batcher = None
+
+    async def start(self, socket_path=None, host='127.0.0.1', port=8765):
+        '''
+        Warm up the workers, and start listening for requests on socket_path
+        if given, otherwise on host and port
+        Returns: asyncio Server object
+        '''
+        # every worker is warmed up once, as it starts
+        if self.workers > 1:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_warm_up_worker)
+        else:
+            # the scan engine is not thread safe, so a single thread scans
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, initializer=_warm_up_worker)
+
+        # start the workers, collecting their warnings
+        loop = asyncio.get_running_loop()
+        warnings = await asyncio.gather(*(loop.run_in_executor(self._pool, warm_up_warning)
+                                          for _ in range(self.workers)))
+        for warning in set(filter(None, warnings)):
+            print(f"pii_recognition warning: {warning}", file=sys.stderr)
+
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+        if socket_path:
+            return await asyncio.start_unix_server(self._handle_connection, path=socket_path)
+        return await asyncio.start_server(self._handle_connection, host=host, port=port)
+
+    async def close(self):
+        '''
+        Stop batching requests and shut down the workers
+        '''
+        if self._batcher is not None:
+            self._batcher.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    async def scan(self, request):
+        '''
+        Queue a scan request to be scanned in the next batch
+        Returns: Tuple of HTTP status code and response dictionary
+        '''
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future))
+        return await future
+
+    async def _run_batches(self):
+        '''
+        Collect queued requests into batches and dispatch them to the workers
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        '''
+        Scan a batch of requests in a worker and resolve their futures
+        '''
+        requests, futures = zip(*batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self._pool, scan_batch,
+                                                                       list(requests))
+        except Exception as e:
+            results = [(500, {'error': f"An error occurred during PII scanning: {e}"})] * len(batch)
+
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+        self.requests_served += len(batch)
+
+    async def _handle_connection(self, reader, writer):
+        '''
+        Answer HTTP requests on a connection until the client closes it
+        '''
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                method, target, version = (request_line.split(' ') + ['', '', ''])[:3]
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                length = headers.get('content-length') or '0'
+                if not length.isdecimal():
+                    await self._respond(writer, 400, {'error': "Content-Length must be a non-negative integer."},
+                                        close=True)
+                    return
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': "Request body is too large."}, close=True)
+                    return
+                try:
+                    body = await reader.readexactly(length) if length else b''
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    # the client disconnected before sending the whole body
+                    return
+
+                status, response = await self._route(method, target, body)
+                close = (headers.get('connection', '').lower() == 'close'
+                         or version == 'HTTP/1.0')
+                await self._respond(writer, status, response, close)
+                if close:
+                    return
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        '''
+        Returns: Tuple of HTTP status code and response dictionary for a
+            request
+        '''
+        if target == '/health':
+            return 200, {'status': 'ok', 'workers': self.workers,
+                         'requests_served': self.requests_served}
+        if target != '/scan':
+            return 404, {'error': f"Unknown path '{target}'."}
+        if method != 'POST':
+            return 405, {'error': "Scan requests must be POSTed."}
+
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            return 400, {'error': f"Request body is not valid JSON: {e}"}
+        return await self.scan(request)
+
+    async def _respond(self, writer, status, response, close=False):
+        '''
+        Write an HTTP response with a JSON body
+        '''
+        body = json.dumps(response).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(socket_path=None, host='127.0.0.1', port=8765, **kwargs):
+    '''
+    Run a ScanService until interrupted
+    Inputs:
+        socket_path: (str) Unix socket path to listen on. Default is None,
+            in which case the service listens on host and port.
+        host: (str) Host to listen on. Default is '127.0.0.1'.
+        port: (int) Port to listen on. Default is 8765.
+        kwargs: Options passed to ScanService
+    '''
+    service = ScanService(**kwargs)
+    server = await service.start(socket_path=socket_path, host=host, port=port)
+    address = socket_path or f"http://{host}:{port}"
+    print(f"pii_recognition: scan service listening on {address}", file=sys.stderr, flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a long lived PII recognition service.")
+
+    parser.add_argument('--socket', type=str, help="Unix socket path to listen on. Default is to listen on --host and --port.")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Host to listen on. Default is 127.0.0.1.")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on. Default is 8765.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes to scan with. Default is 1.")
+    parser.add_argument('--batch_window_ms', type=float, default=2, help="Milliseconds to wait for concurrent requests to batch together. Default is 2.")
+    parser.add_argument('--max_batch', type=int, default=32, help="Maximum number of requests scanned in one batch. Default is 32.")
+
+    a = parser.parse_args()
+
+    try:
+        asyncio.run(serve(socket_path=a.socket, host=a.host, port=a.port, workers=a.workers,
+                          batch_window=a.batch_window_ms / 1000, max_batch=a.max_batch))
+    except KeyboardInterrupt:
+        pass